@@ -2,19 +2,32 @@
 Configuration module for Marzneshin to Pasarguard migration.
 """
 from dataclasses import dataclass
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, FrozenSet, Optional, Tuple
 import os
 from pathlib import Path
-from dotenv import load_dotenv
+from dotenv import dotenv_values
 
-# Load environment variables from .env file (in marzneshin directory)
+# Environment variables are read from the .env file (in marzneshin directory)
 env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(dotenv_path=env_path)
 
 
-@dataclass
+@lru_cache(maxsize=1)
+def _env() -> Dict[str, str]:
+    """
+    Parse the .env file once and overlay the process environment.
+    
+    Variables already set in the environment take precedence over .env,
+    matching load_dotenv's default behaviour.
+    """
+    values = {key: value for key, value in dotenv_values(env_path).items() if value is not None}
+    values.update(os.environ)
+    return values
+
+
+@dataclass(frozen=True)
 class DatabaseConfig:
-    """Database configuration."""
+    """Database configuration (immutable, hashable)."""
     host: str
     port: int
     user: str
@@ -27,13 +40,49 @@ class DatabaseConfig:
 class MigrationConfig:
     """Migration configuration."""
     # Migration settings
-    batch_size: int = 1000
+    # Rows per multi-row INSERT batch (override with MYSQL_BATCH_SIZE)
+    batch_size: int = 10000
+    # Rows validated, converted and loaded (one transaction) per pass for tables
+    # extracted up front, so a large table is not converted all at once
+    # (override with MIGRATION_BULK_SIZE, 0 = whole table)
+    bulk_size: int = 10000
     truncate_strings: bool = True
     skip_on_error: bool = True
     
     # Large table handling
     # Maximum rows to extract from usage/log tables (0 = no limit)
     max_usage_table_rows: int = 100000  # Limit usage tables to 100k most recent rows
+    # Rows per keyset-paginated query when streaming usage tables
+    usage_chunk_size: int = 131072
+    # Row count from which any table is loaded with LOAD DATA LOCAL INFILE (0 = bulk_load tables only).
+    # Opt-in: LOCAL implies IGNORE, so duplicate keys and bad values become warnings
+    # instead of going through the INSERT failure reporting.
+    infile_min_rows: int = 0
+    
+    # Tables skipped by extraction and migration (EXCLUDE_TABLES plus --exclude-tables)
+    exclude_tables: FrozenSet[str] = frozenset()
+    
+    # Bulk load session
+    # Session variables set on every Pasarguard connection while tables are loaded
+    # and reset once loading is done. Only safe because the target is cleared first.
+    bulk_mode: bool = True
+    bulk_session_variables: Tuple[Tuple[str, int], ...] = (
+        ('foreign_key_checks', 0),
+        ('unique_checks', 0),
+        ('sql_log_bin', 0),  # Requires SUPER/SYSTEM_VARIABLES_ADMIN; skipped otherwise
+        ('bulk_insert_buffer_size', 268435456),  # 256 MiB cache for multi-row INSERT / LOAD DATA
+    )
+    # Drop non-unique secondary indexes while a table is loaded and rebuild them
+    # afterwards, for tables with at least defer_indexes_min_rows rows (always for streamed tables)
+    defer_indexes: bool = True
+    defer_indexes_min_rows: int = 10000
+    
+    # MySQL driver: 'auto' (mysqlclient if installed, else PyMySQL), 'mysqlclient' or 'pymysql'
+    driver: str = 'auto'
+    
+    # Concurrency
+    # Tables on the same foreign key level are migrated by this many threads (1 = serial)
+    parallel_workers: int = 4
     
     # Alembic version settings
     # Set this to the latest PasarGuard migration revision after successful migration
@@ -43,19 +92,37 @@ class MigrationConfig:
     
     # Logging
     log_level: str = 'INFO'
-    log_file: Optional[str] = None
+    log_file: str = ""  # Empty = console only
+    
+    # Subscription URL mapping
+    url_mapping_output_file: str = 'subscription_url_mapping.json'
+    marzneshin_subscription_path: str = 'sub'
+    pasarguard_subscription_path: str = 'sub'
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    """Per-table migration metadata."""
+    name: str
+    pk: Optional[str] = 'id'  # Integer primary key used for keyset pagination
+    usage_table: bool = False  # Capped by max_usage_table_rows and streamed in batches
+    bulk_load: bool = False  # Loaded with LOAD DATA LOCAL INFILE instead of INSERT batches
+    association: bool = False  # Pure association table, loaded with FK checks disabled
+    ignore_duplicates: bool = False  # Loaded with INSERT IGNORE
 
 
 def _get_env_required(key: str) -> str:
     """Get required environment variable or raise error."""
-    value = os.getenv(key)
+    value = _env().get(key)
     if value is None:
         raise ValueError(f"Required environment variable '{key}' is not set")
     return value
 
 
-def _get_env_int(key: str) -> int:
-    """Get required integer environment variable or raise error."""
+def _get_env_int(key: str, default: Optional[int] = None) -> int:
+    """Get integer environment variable, required unless a default is given."""
+    if default is not None and key not in _env():
+        return default
     value = _get_env_required(key)
     try:
         return int(value)
@@ -80,43 +147,73 @@ PASARGUARD_CONFIG = DatabaseConfig(
     database=_get_env_required('PASARGUARD_DB'),
 )
 
-MIGRATION_CONFIG = MigrationConfig()
-
-
-# Table migration order (respecting foreign key dependencies)
-TABLE_ORDER = [
+# Preferred table migration order with per-table loading metadata. The actual
+# order is derived at runtime from the target database's foreign keys (see
+# get_table_dependency_order); this order is used as the tie-breaker and as a
+# fallback if the schema cannot be introspected.
+TABLE_SPECS = (
     # Core tables (no dependencies)
-    "admins",
-    "core_configs",
-    "nodes",
-    "inbounds",
-    "groups",
+    TableSpec("admins"),
+    TableSpec("core_configs"),
+    TableSpec("nodes"),
+    TableSpec("inbounds", ignore_duplicates=True),  # Can have duplicates if migration is re-run
+    TableSpec("groups"),
     
     # Association tables
-    "inbounds_groups_association",
+    TableSpec("inbounds_groups_association", pk=None, association=True),
     
     # Dependent tables
-    "hosts",
-    "user_templates",
-    "template_group_association",
+    TableSpec("hosts"),
+    TableSpec("user_templates"),
+    TableSpec("template_group_association", pk=None, association=True),
     
     # User tables
-    "users",
-    "users_groups_association",
-    "next_plans",
+    TableSpec("users"),
+    TableSpec("users_groups_association", pk=None, association=True),
+    TableSpec("next_plans"),
     
     # Usage and log tables
-    "admin_usage_logs",
-    "user_usage_logs",
-    "notification_reminders",
-    "user_subscription_updates",
-    "node_user_usages",
-    "node_usages",
-    "node_stats",
-]
+    TableSpec("admin_usage_logs", usage_table=True, bulk_load=True, ignore_duplicates=True),
+    TableSpec("user_usage_logs", usage_table=True, bulk_load=True, ignore_duplicates=True),
+    TableSpec("notification_reminders"),
+    TableSpec("user_subscription_updates"),
+    TableSpec("node_user_usages", usage_table=True, bulk_load=True, ignore_duplicates=True),
+    TableSpec("node_usages", usage_table=True, bulk_load=True, ignore_duplicates=True),
+    TableSpec("node_stats", bulk_load=True, ignore_duplicates=True),
+)
+
+TABLE_SPECS_BY_NAME = {spec.name: spec for spec in TABLE_SPECS}
+
+TABLE_ORDER = [spec.name for spec in TABLE_SPECS]
+
+# Large usage/log tables: capped by max_usage_table_rows and streamed in batches
+# during migration instead of being loaded into memory up front
+USAGE_TABLES = frozenset(spec.name for spec in TABLE_SPECS if spec.usage_table)
+
+# Pure association tables: loaded with foreign key checks disabled, since their
+# references are already validated client-side by DataValidator
+ASSOCIATION_TABLES = frozenset(spec.name for spec in TABLE_SPECS if spec.association)
+
+# Tables loaded with LOAD DATA LOCAL INFILE instead of INSERT batches
+BULK_TABLES = frozenset(spec.name for spec in TABLE_SPECS if spec.bulk_load)
+
+
+def get_table_spec(table: str) -> TableSpec:
+    """Get the metadata for a target table (defaults for unknown tables)."""
+    spec = TABLE_SPECS_BY_NAME.get(table)
+    return spec if spec is not None else TableSpec(table)
+
+
+# Ordering constraints that are not expressed as foreign keys in the target schema
+TABLE_DEPENDENCY_HINTS = {
+    # inbounds reuse the unique tags assigned while converting core_configs
+    "inbounds": ["core_configs"],
+    # hosts resolve inbound tags through the same converter state
+    "hosts": ["inbounds"],
+}
 
 # Tables to exclude from migration
-EXCLUDE_TABLES = {
+EXCLUDE_TABLES = frozenset({
     "alembic_version",
     "django_migrations",
     "flyway_schema_history",
@@ -124,11 +221,11 @@ EXCLUDE_TABLES = {
     "jwt",  # Pasarguard-specific
     "system",  # Pasarguard-specific
     "settings",  # Pasarguard-specific
-}
+})
 
 # Complete list of valid PasarGuard tables
 # Any table not in this list will be dropped after migration
-PASARGUARD_TABLES = {
+PASARGUARD_TABLES = frozenset({
     # Core tables
     "admins",
     "admin_usage_logs",
@@ -157,5 +254,13 @@ PASARGUARD_TABLES = {
     
     # System tables
     "alembic_version",
-}
+})
 
+
+MIGRATION_CONFIG = MigrationConfig(
+    batch_size=_get_env_int('MYSQL_BATCH_SIZE', MigrationConfig.batch_size),
+    bulk_size=_get_env_int('MIGRATION_BULK_SIZE', MigrationConfig.bulk_size),
+    parallel_workers=_get_env_int('MIGRATION_PARALLEL_WORKERS', MigrationConfig.parallel_workers),
+    exclude_tables=EXCLUDE_TABLES,
+    driver=_env().get('MYSQL_DRIVER', MigrationConfig.driver),
+)
@@ -0,0 +1,25 @@
+"""
+Database driver helpers.
+"""
+
+from migration.db.driver import (
+    DRIVERS,
+    connect,
+    dict_cursor,
+    stream_cursor,
+    get_driver_name,
+    MySQLError,
+    OperationalError,
+    InterfaceError
+)
+
+__all__ = [
+    'DRIVERS',
+    'connect',
+    'dict_cursor',
+    'stream_cursor',
+    'get_driver_name',
+    'MySQLError',
+    'OperationalError',
+    'InterfaceError'
+]
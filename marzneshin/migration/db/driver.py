@@ -0,0 +1,120 @@
+"""
+MySQL driver selection.
+
+The migration runs on PyMySQL, which is always installed. When the C-based
+mysqlclient package (imported as MySQLdb) is available it can be used instead,
+which is noticeably faster at encoding parameters and decoding result rows.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import pymysql
+import pymysql.cursors
+
+try:
+    import MySQLdb
+    import MySQLdb.cursors
+except ImportError:  # mysqlclient is optional
+    MySQLdb = None
+
+from migration.config import DatabaseConfig, MIGRATION_CONFIG
+
+logger = logging.getLogger(__name__)
+
+DRIVERS = ('auto', 'mysqlclient', 'pymysql')
+
+# Exception classes of every available driver, for use in except clauses
+MySQLError: Tuple[type, ...] = (pymysql.err.MySQLError,)
+OperationalError: Tuple[type, ...] = (pymysql.err.OperationalError,)
+InterfaceError: Tuple[type, ...] = (pymysql.err.InterfaceError,)
+if MySQLdb is not None:
+    MySQLError += (MySQLdb.MySQLError,)
+    OperationalError += (MySQLdb.OperationalError,)
+    InterfaceError += (MySQLdb.InterfaceError,)
+
+# Cursor classes per driver module
+_CURSORS: Dict[str, Dict[str, type]] = {
+    'pymysql': {
+        'dict': pymysql.cursors.DictCursor,
+        'stream': pymysql.cursors.SSCursor,
+    },
+}
+if MySQLdb is not None:
+    _CURSORS['MySQLdb'] = {
+        'dict': MySQLdb.cursors.DictCursor,
+        'stream': MySQLdb.cursors.SSCursor,
+    }
+
+
+def get_driver_name(driver: Optional[str] = None) -> str:
+    """
+    Resolve the driver to use.
+    
+    Args:
+        driver: 'auto', 'mysqlclient' or 'pymysql' (defaults to MIGRATION_CONFIG.driver)
+        
+    Returns:
+        'mysqlclient' or 'pymysql'
+    """
+    driver = (driver or MIGRATION_CONFIG.driver).lower()
+    if driver not in DRIVERS:
+        raise ValueError(f"Unknown MySQL driver '{driver}' (expected one of: {', '.join(DRIVERS)})")
+    
+    if driver == 'auto':
+        return 'mysqlclient' if MySQLdb is not None else 'pymysql'
+    if driver == 'mysqlclient' and MySQLdb is None:
+        logger.warning("mysqlclient is not installed, falling back to PyMySQL")
+        return 'pymysql'
+    return driver
+
+
+def connect(config: DatabaseConfig, driver: Optional[str] = None, **kwargs: Any):
+    """
+    Open a connection with dictionary rows as the default cursor.
+    
+    Both drivers accept the same keyword arguments for everything this tool
+    uses (timeouts, autocommit, local_infile).
+    
+    Args:
+        config: Database configuration
+        driver: Driver override (defaults to MIGRATION_CONFIG.driver)
+        **kwargs: Extra connection arguments
+        
+    Returns:
+        DB-API connection
+    """
+    name = get_driver_name(driver)
+    module = MySQLdb if name == 'mysqlclient' else pymysql
+    return module.connect(
+        host=config.host,
+        port=config.port,
+        user=config.user,
+        password=config.password,
+        database=config.database,
+        charset=config.charset,
+        cursorclass=_CURSORS[module.__name__]['dict'],
+        **kwargs
+    )
+
+
+@lru_cache(maxsize=None)
+def _driver_cursors(connection_class: type) -> Dict[str, type]:
+    """Get the cursor classes of a connection class's driver, resolved once per class."""
+    return _CURSORS[connection_class.__module__.split('.')[0]]
+
+
+def _cursor_class(conn, kind: str) -> type:
+    """Get a cursor class matching the connection's driver."""
+    return _driver_cursors(type(conn))[kind]
+
+
+def dict_cursor(conn):
+    """Open a cursor returning rows as dictionaries."""
+    return conn.cursor(_cursor_class(conn, 'dict'))
+
+
+def stream_cursor(conn):
+    """Open an unbuffered (server-side) cursor returning rows as tuples."""
+    return conn.cursor(_cursor_class(conn, 'stream'))
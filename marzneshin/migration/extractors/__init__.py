@@ -2,7 +2,6 @@
 Extractors module for loading data from various sources.
 """
 
-from migration.extractors.database import MarzneshinExtractor
-
-__all__ = ['MarzneshinExtractor']
+from migration.extractors.database import MarzneshinExtractor, SourceColumn
 
+__all__ = ['MarzneshinExtractor', 'SourceColumn']
@@ -4,16 +4,32 @@ Database extractor for Marzneshin MySQL database.
 
 import logging
 import sys
+import threading
 import time
-from typing import Dict, List, Any, Optional
-import pymysql
-from pymysql.cursors import DictCursor
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterator, List, Any, Mapping, NamedTuple, Optional, Tuple
 
-from migration.config import DatabaseConfig, EXCLUDE_TABLES, MIGRATION_CONFIG
+from migration import db
+from migration.config import DatabaseConfig, MIGRATION_CONFIG, USAGE_TABLES
+from migration.models.mappings import LOW_CARDINALITY_COLUMNS
 
 logger = logging.getLogger(__name__)
 
 
+class SourceColumn(NamedTuple):
+    """Column of a source table, as reported by INFORMATION_SCHEMA.COLUMNS."""
+    name: str
+    data_type: str
+    char_max_len: Optional[int]
+    is_nullable: bool
+    column_default: Optional[str]
+
+
+# Source schemas keyed by connection settings, shared by every extractor (and worker thread)
+_SCHEMA_CACHE: Dict[DatabaseConfig, Mapping[str, Tuple[SourceColumn, ...]]] = {}
+_SCHEMA_LOCK = threading.Lock()
+
+
 class MarzneshinExtractor:
     """Extract data from Marzneshin MySQL database."""
     
@@ -25,26 +41,22 @@ class MarzneshinExtractor:
             config: Database configuration
         """
         self.config = config
-        self.conn: Optional[pymysql.Connection] = None
+        self.conn: Optional[Any] = None
+        # Table names, filled on first use (see list_tables)
+        self._tables: Optional[FrozenSet[str]] = None
     
     def connect(self):
         """Connect to Marzneshin database."""
         try:
             logger.info(f"Connecting to Marzneshin at {self.config.host}:{self.config.port}...")
-            self.conn = pymysql.connect(
-                host=self.config.host,
-                port=self.config.port,
-                user=self.config.user,
-                password=self.config.password,
-                database=self.config.database,
-                charset=self.config.charset,
-                cursorclass=DictCursor,
+            self.conn = db.connect(
+                self.config,
                 connect_timeout=10,  # 10 second timeout
                 read_timeout=300,  # 5 minute read timeout (for large tables)
                 write_timeout=30  # 30 second write timeout
             )
             logger.info(f"✓ Connected to Marzneshin database at {self.config.host}")
-        except pymysql.err.OperationalError as e:
+        except db.OperationalError as e:
             logger.error(f"✗ Cannot connect to Marzneshin database:")
             logger.error(f"  Host: {self.config.host}:{self.config.port}")
             logger.error(f"  Database: {self.config.database}")
@@ -71,26 +83,80 @@ class MarzneshinExtractor:
         """Context manager exit."""
         self.disconnect()
     
-    def discover_tables(self) -> List[str]:
+    def list_tables(self) -> FrozenSet[str]:
         """
-        Discover all tables in the database.
+        Get the names of all tables in the database (cached after the first call).
         
         Returns:
-            List of table names
+            Frozenset of table names
         """
         if not self.conn:
             raise RuntimeError("Not connected to database")
         
-        with self.conn.cursor() as cursor:
-            cursor.execute("SHOW TABLES")
-            tables = [row[f"Tables_in_{self.config.database}"] for row in cursor.fetchall()]
-            
+        if self._tables is None:
+            with self.conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT TABLE_NAME
+                    FROM INFORMATION_SCHEMA.TABLES
+                    WHERE TABLE_SCHEMA = DATABASE()
+                    AND TABLE_TYPE = 'BASE TABLE'
+                """)
+                self._tables = frozenset(row['TABLE_NAME'] for row in cursor.fetchall())
+        
+        return self._tables
+    
+    def discover_tables(self) -> List[str]:
+        """
+        Discover all tables in the database.
+        
+        Returns:
+            List of table names
+        """
         # Filter out excluded tables
-        tables = [t for t in tables if t not in EXCLUDE_TABLES]
+        exclude_tables = MIGRATION_CONFIG.exclude_tables
+        tables = sorted(t for t in self.list_tables() if t not in exclude_tables)
         logger.info(f"Discovered {len(tables)} tables: {', '.join(tables)}")
         
         return tables
     
+    def get_schema(self) -> Mapping[str, Tuple[SourceColumn, ...]]:
+        """
+        Get the columns of every table in the database.
+        
+        Read with a single INFORMATION_SCHEMA query the first time it is needed
+        for a database and shared, read-only, by all extractors afterwards.
+        
+        Returns:
+            Read-only mapping of {table: columns in ordinal order}
+        """
+        if not self.conn:
+            raise RuntimeError("Not connected to database")
+        
+        with _SCHEMA_LOCK:
+            schema = _SCHEMA_CACHE.get(self.config)
+            if schema is None:
+                tables: Dict[str, List[SourceColumn]] = {}
+                with self.conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH,
+                               IS_NULLABLE, COLUMN_DEFAULT
+                        FROM INFORMATION_SCHEMA.COLUMNS
+                        WHERE TABLE_SCHEMA = DATABASE()
+                        ORDER BY TABLE_NAME, ORDINAL_POSITION
+                    """)
+                    for row in cursor.fetchall():
+                        tables.setdefault(row['TABLE_NAME'], []).append(SourceColumn(
+                            name=row['COLUMN_NAME'],
+                            data_type=row['DATA_TYPE'],
+                            char_max_len=row['CHARACTER_MAXIMUM_LENGTH'],
+                            is_nullable=row['IS_NULLABLE'] == 'YES',
+                            column_default=row['COLUMN_DEFAULT']
+                        ))
+                schema = MappingProxyType({table: tuple(columns) for table, columns in tables.items()})
+                _SCHEMA_CACHE[self.config] = schema
+        
+        return schema
+    
     def get_table_columns(self, table: str) -> List[str]:
         """
         Get column names for a table.
@@ -101,124 +167,284 @@ class MarzneshinExtractor:
         Returns:
             List of column names
         """
-        if not self.conn:
-            raise RuntimeError("Not connected to database")
+        columns = self.get_schema().get(table)
+        if columns is not None:
+            return [column.name for column in columns]
         
+        # Not in the cached schema (e.g. created after it was read)
         with self.conn.cursor() as cursor:
             cursor.execute(f"DESCRIBE `{table}`")
             return [row['Field'] for row in cursor.fetchall()]
     
-    def extract_table(self, table: str, limit: Optional[int] = None, batch_size: int = 5000, max_rows: Optional[int] = None) -> List[Dict[str, Any]]:
+    def _build_table_query(
+        self,
+        table: str,
+        columns: List[str],
+        limit: Optional[int] = None,
+        max_rows: Optional[int] = None
+    ) -> Tuple[str, int]:
         """
-        Extract all data from a table.
+        Build the SELECT query for a table, pushing row limits into SQL.
         
         Args:
             table: Table name
+            columns: Column names of the table
             limit: Optional row limit
-            batch_size: Number of rows to fetch per batch (for progress reporting)
             max_rows: Maximum rows to extract (auto-applied for very large tables)
             
         Returns:
-            List of rows as dictionaries
+            Tuple of (query, expected_row_count)
+        """
+        # Escape column names with backticks
+        escaped_columns = [f"`{col}`" for col in columns]
+        
+        # Get total count first to decide if we need filtering
+        with self.conn.cursor() as count_cursor:
+            count_cursor.execute(f"SELECT COUNT(*) as count FROM `{table}`")
+            total_count = count_cursor.fetchone()['count']
+        
+        # Build query
+        query = f"SELECT {', '.join(escaped_columns)} FROM `{table}`"
+        
+        # For very large usage tables, apply intelligent filtering
+        is_usage_table = table in USAGE_TABLES
+        if is_usage_table and total_count > 100000 and 'created_at' in columns:
+            # Limit to recent data for very large usage tables
+            if max_rows is None:
+                max_rows = MIGRATION_CONFIG.max_usage_table_rows if MIGRATION_CONFIG.max_usage_table_rows > 0 else None
+            
+            if max_rows and max_rows < total_count:
+                logger.warning(
+                    f"  Table {table} has {total_count:,} rows. "
+                    f"Limiting to {max_rows:,} most recent rows (based on created_at). "
+                    f"Set MIGRATION_CONFIG.max_usage_table_rows=0 to extract all rows."
+                )
+                query += " ORDER BY `created_at` DESC"
+                query += f" LIMIT {max_rows}"
+                total_count = max_rows
+        else:
+            # Add ordering if ID column exists
+            if 'id' in columns:
+                query += " ORDER BY `id`"
+            
+            # Add limit if specified
+            if limit:
+                query += f" LIMIT {limit}"
+                total_count = min(total_count, limit)
+            elif max_rows and total_count > max_rows:
+                logger.warning(f"  Table {table} has {total_count:,} rows. Limiting to {max_rows:,} rows...")
+                query += f" LIMIT {max_rows}"
+                total_count = max_rows
+        
+        return query, total_count
+    
+    def iter_table(
+        self,
+        table: str,
+        limit: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        max_rows: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream a table in fixed-size batches.
+        
+        Rows are read through an unbuffered server-side cursor, so only one
+        batch is held in memory at a time. The connection cannot be used for
+        other queries until the generator is exhausted or closed.
+        
+        Args:
+            table: Table name
+            limit: Optional row limit
+            batch_size: Rows per batch (defaults to MIGRATION_CONFIG.batch_size)
+            max_rows: Maximum rows to extract (auto-applied for very large tables)
+            
+        Yields:
+            Lists of rows as dictionaries
         """
         if not self.conn:
             raise RuntimeError("Not connected to database")
         
+        batch_size = batch_size or MIGRATION_CONFIG.batch_size
+        
         try:
             # Get columns
             columns = self.get_table_columns(table)
             if not columns:
                 logger.warning(f"Table {table} has no columns")
-                return []
+                return
             
-            # Escape column names with backticks
-            escaped_columns = [f"`{col}`" for col in columns]
+            query, total_count = self._build_table_query(table, columns, limit, max_rows)
             
-            # Get total count first to decide if we need filtering
-            with self.conn.cursor() as count_cursor:
-                count_cursor.execute(f"SELECT COUNT(*) as count FROM `{table}`")
-                total_count = count_cursor.fetchone()['count']
-            
-            # Build query
-            query = f"SELECT {', '.join(escaped_columns)} FROM `{table}`"
-            
-            # For very large usage tables, apply intelligent filtering
-            is_usage_table = table in ['node_user_usages', 'node_usages', 'admin_usage_logs', 'user_usage_logs']
-            if is_usage_table and total_count > 100000 and 'created_at' in columns:
-                # Limit to recent data for very large usage tables
-                if max_rows is None:
-                    max_rows = MIGRATION_CONFIG.max_usage_table_rows if MIGRATION_CONFIG.max_usage_table_rows > 0 else None
-                
-                if max_rows and max_rows < total_count:
-                    logger.warning(
-                        f"  Table {table} has {total_count:,} rows. "
-                        f"Limiting to {max_rows:,} most recent rows (based on created_at). "
-                        f"Set MIGRATION_CONFIG.max_usage_table_rows=0 to extract all rows."
-                    )
-                    query += " ORDER BY `created_at` DESC"
-                    query += f" LIMIT {max_rows}"
-                    total_count = max_rows
-            else:
-                # Add ordering if ID column exists
-                if 'id' in columns:
-                    query += " ORDER BY `id`"
-                
-                # Add limit if specified
-                if limit:
-                    query += f" LIMIT {limit}"
-                    total_count = limit
-                elif max_rows and total_count > max_rows:
-                    logger.warning(f"  Table {table} has {total_count:,} rows. Limiting to {max_rows:,} rows...")
-                    if 'id' in columns:
-                        query += f" LIMIT {max_rows}"
-                    total_count = max_rows
-            
-            # Use batch fetching for large tables
-            rows = []
             start_time = time.time()
             logger.info(f"  Fetching {total_count:,} rows from {table}...")
             sys.stdout.flush()  # Force flush
             
-            with self.conn.cursor() as cursor:
+            # Plain tuple cursor; rows are zipped with the column names read once
+            # from cursor.description instead of per row by a dict cursor
+            with db.stream_cursor(self.conn) as cursor:
+                cursor.arraysize = batch_size
                 query_start = time.time()
                 cursor.execute(query)
                 query_time = time.time() - query_start
-                logger.info(f"  Query executed in {query_time:.2f}s, fetching results...")
+                logger.info(f"  Query executed in {query_time:.2f}s, streaming results...")
                 sys.stdout.flush()
                 
-                # Fetch in batches to show progress
+                names = tuple(desc[0] for desc in cursor.description)
+                # {value: value} per low-cardinality column, so equal values share one object
+                low_cardinality = LOW_CARDINALITY_COLUMNS.get(table, frozenset())
+                pools = [(name, {}) for name in names if name in low_cardinality]
                 fetched = 0
                 last_logged = 0
                 last_log_time = time.time()
                 while True:
-                    fetch_start = time.time()
-                    batch = cursor.fetchmany(batch_size)
-                    fetch_time = time.time() - fetch_start
-                    
-                    if not batch:
+                    records = cursor.fetchmany(batch_size)
+                    if not records:
                         break
                     
-                    rows.extend(batch)
+                    batch = [dict(zip(names, record)) for record in records]
+                    for row in batch:
+                        for name, pool in pools:
+                            value = row[name]
+                            if value is not None:
+                                row[name] = pool.setdefault(value, value)
                     fetched += len(batch)
                     
                     # Log progress every batch (force flush to see real-time progress)
                     current_time = time.time()
                     if total_count > batch_size and (fetched - last_logged >= batch_size or current_time - last_log_time >= 2.0):
-                        progress_pct = (fetched / total_count) * 100
+                        progress_pct = (fetched / total_count) * 100 if total_count else 100.0
                         elapsed = current_time - start_time
                         logger.info(f"  Progress: {fetched:,}/{total_count:,} rows ({progress_pct:.1f}%) - {elapsed:.1f}s elapsed")
                         sys.stdout.flush()
                         last_logged = fetched
                         last_log_time = current_time
+                    
+                    yield batch
             
             elapsed_time = time.time() - start_time
-            logger.info(f"Extracted {len(rows)} rows from {table} in {elapsed_time:.2f}s")
-            return rows
+            logger.info(f"Extracted {fetched} rows from {table} in {elapsed_time:.2f}s")
             
         except Exception as e:
             logger.error(f"Error extracting table {table}: {e}")
             raise
     
+    def iter_table_keyset(
+        self,
+        table: str,
+        pk: str = 'id',
+        chunk_size: Optional[int] = None,
+        max_rows: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream a table in primary key order using keyset pagination.
+        
+        Each chunk is a separate ``WHERE pk > last_pk ORDER BY pk LIMIT n``
+        query, so the source only ever walks the primary key index forward and
+        no query stays open between chunks. For usage tables the
+        MIGRATION_CONFIG.max_usage_table_rows limit keeps the rows with the
+        highest keys (the most recent ones). Tables without the key column fall
+        back to iter_table.
+        
+        Args:
+            table: Table name
+            pk: Integer primary key column to paginate on
+            chunk_size: Rows per query (defaults to MIGRATION_CONFIG.usage_chunk_size)
+            max_rows: Maximum rows to extract (defaults to the usage table limit)
+            
+        Yields:
+            Lists of rows as dictionaries
+        """
+        if not self.conn:
+            raise RuntimeError("Not connected to database")
+        
+        columns = self.get_table_columns(table)
+        if pk not in columns:
+            yield from self.iter_table(table, max_rows=max_rows)
+            return
+        
+        chunk_size = chunk_size or MIGRATION_CONFIG.usage_chunk_size
+        if max_rows is None and table in USAGE_TABLES:
+            max_rows = MIGRATION_CONFIG.max_usage_table_rows or None
+        
+        escaped_columns = ', '.join(f"`{col}`" for col in columns)
+        select = f"SELECT {escaped_columns} FROM `{table}`"
+        
+        try:
+            start_time = time.time()
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"SELECT COUNT(*) as count FROM `{table}`")
+                total_count = cursor.fetchone()['count']
+                
+                # Lower bound for "most recent N rows": one index-only scan of the key
+                first_id = None
+                if max_rows and max_rows < total_count:
+                    cursor.execute(
+                        f"SELECT `{pk}` AS pk FROM `{table}` ORDER BY `{pk}` DESC LIMIT 1 OFFSET %s",
+                        (max_rows - 1,)
+                    )
+                    first_id = cursor.fetchone()['pk']
+                    logger.warning(
+                        f"  Table {table} has {total_count:,} rows. "
+                        f"Limiting to {max_rows:,} most recent rows (by {pk}). "
+                        f"Set MIGRATION_CONFIG.max_usage_table_rows=0 to extract all rows."
+                    )
+                    total_count = max_rows
+                
+                logger.info(f"  Fetching {total_count:,} rows from {table} in chunks of {chunk_size:,}...")
+                
+                fetched = 0
+                last_id = None
+                while True:
+                    if last_id is not None:
+                        cursor.execute(f"{select} WHERE `{pk}` > %s ORDER BY `{pk}` LIMIT %s", (last_id, chunk_size))
+                    elif first_id is not None:
+                        cursor.execute(f"{select} WHERE `{pk}` >= %s ORDER BY `{pk}` LIMIT %s", (first_id, chunk_size))
+                    else:
+                        cursor.execute(f"{select} ORDER BY `{pk}` LIMIT %s", (chunk_size,))
+                    
+                    batch = cursor.fetchall()
+                    if not batch:
+                        break
+                    
+                    last_id = batch[-1][pk]
+                    fetched += len(batch)
+                    if total_count > chunk_size:
+                        progress_pct = min(fetched / total_count * 100, 100.0)
+                        logger.info(
+                            f"  Progress: {fetched:,}/{total_count:,} rows ({progress_pct:.1f}%) - "
+                            f"{time.time() - start_time:.1f}s elapsed"
+                        )
+                    
+                    yield batch
+                    
+                    if len(batch) < chunk_size:
+                        break
+            
+            elapsed_time = time.time() - start_time
+            logger.info(f"Extracted {fetched} rows from {table} in {elapsed_time:.2f}s")
+            
+        except Exception as e:
+            logger.error(f"Error extracting table {table}: {e}")
+            raise
+    
+    def extract_table(self, table: str, limit: Optional[int] = None, batch_size: int = 5000, max_rows: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Extract all data from a table.
+        
+        Args:
+            table: Table name
+            limit: Optional row limit
+            batch_size: Number of rows to fetch per batch (for progress reporting)
+            max_rows: Maximum rows to extract (auto-applied for very large tables)
+            
+        Returns:
+            List of rows as dictionaries
+        """
+        rows = []
+        for batch in self.iter_table(table, limit=limit, batch_size=batch_size, max_rows=max_rows):
+            rows.extend(batch)
+        return rows
+    
     def extract_all_tables(self, table_list: Optional[List[str]] = None) -> Dict[str, List[Dict[str, Any]]]:
         """
         Extract data from all tables.
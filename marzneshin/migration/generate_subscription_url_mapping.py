@@ -12,14 +12,13 @@ from math import ceil
 from base64 import b64encode
 from hashlib import sha256
 from typing import Dict, Any, Optional
-import pymysql
-from pymysql.cursors import DictCursor
 
 # Add project root to path if running from migration directory
 if Path(__file__).parent.name == 'migration':
     project_root = Path(__file__).parent.parent
     sys.path.insert(0, str(project_root))
 
+from migration import db
 from migration.config import MARZNESHIN_CONFIG, PASARGUARD_CONFIG
 from migration.utils import setup_logging
 
@@ -30,7 +29,7 @@ def get_marzneshin_subscription_url_prefix(admin_id: Optional[int], marzneshin_c
     """Get subscription URL prefix from Marzneshin admin or settings."""
     try:
         if admin_id:
-            with marzneshin_conn.cursor(DictCursor) as cursor:
+            with marzneshin_conn.cursor() as cursor:
                 cursor.execute(
                     "SELECT subscription_url_prefix FROM admins WHERE id = %s",
                     (admin_id,)
@@ -51,7 +50,7 @@ def get_pasarguard_subscription_url_prefix(admin_id: Optional[int], pasarguard_c
     """Get subscription URL prefix from Pasarguard admin or settings."""
     try:
         if admin_id:
-            with pasarguard_conn.cursor(DictCursor) as cursor:
+            with pasarguard_conn.cursor() as cursor:
                 cursor.execute(
                     "SELECT sub_domain FROM admins WHERE id = %s",
                     (admin_id,)
@@ -61,7 +60,7 @@ def get_pasarguard_subscription_url_prefix(admin_id: Optional[int], pasarguard_c
                     return result['sub_domain']
         
         # Get from settings
-        with pasarguard_conn.cursor(DictCursor) as cursor:
+        with pasarguard_conn.cursor() as cursor:
             cursor.execute("SELECT subscription FROM settings WHERE id = 0")
             result = cursor.fetchone()
             if result and result.get('subscription'):
@@ -91,7 +90,7 @@ def get_pasarguard_jwt_secret(pasarguard_conn) -> str:
     """Get JWT secret key from Pasarguard database."""
     try:
         # Check if jwt table exists
-        with pasarguard_conn.cursor(DictCursor) as cursor:
+        with pasarguard_conn.cursor() as cursor:
             cursor.execute("SHOW TABLES LIKE 'jwt'")
             if not cursor.fetchone():
                 logger.warning("JWT table not found in Pasarguard database. Using default secret.")
@@ -147,26 +146,11 @@ def generate_subscription_url_mapping(
     
     # Connect to databases
     logger.info("Connecting to Marzneshin database...")
-    marzneshin_conn = pymysql.connect(
-        host=MARZNESHIN_CONFIG.host,
-        port=MARZNESHIN_CONFIG.port,
-        user=MARZNESHIN_CONFIG.user,
-        password=MARZNESHIN_CONFIG.password,
-        database=MARZNESHIN_CONFIG.database,
-        charset=MARZNESHIN_CONFIG.charset,
-        cursorclass=DictCursor
-    )
+    # Dictionary rows are the default cursor of db.connect connections
+    marzneshin_conn = db.connect(MARZNESHIN_CONFIG)
     
     logger.info("Connecting to Pasarguard database...")
-    pasarguard_conn = pymysql.connect(
-        host=PASARGUARD_CONFIG.host,
-        port=PASARGUARD_CONFIG.port,
-        user=PASARGUARD_CONFIG.user,
-        password=PASARGUARD_CONFIG.password,
-        database=PASARGUARD_CONFIG.database,
-        charset=PASARGUARD_CONFIG.charset,
-        cursorclass=DictCursor
-    )
+    pasarguard_conn = db.connect(PASARGUARD_CONFIG)
     
     try:
         # Get Pasarguard JWT secret for token generation
@@ -174,7 +158,7 @@ def generate_subscription_url_mapping(
         
         # Get all users from both databases
         logger.info("Fetching users from Marzneshin...")
-        with marzneshin_conn.cursor(DictCursor) as cursor:
+        with marzneshin_conn.cursor() as cursor:
             cursor.execute("""
                 SELECT u.id, u.username, u.key, u.admin_id, a.subscription_url_prefix as admin_subscription_url_prefix
                 FROM users u
@@ -184,7 +168,7 @@ def generate_subscription_url_mapping(
             marzneshin_users = cursor.fetchall()
         
         logger.info("Fetching users from Pasarguard...")
-        with pasarguard_conn.cursor(DictCursor) as cursor:
+        with pasarguard_conn.cursor() as cursor:
             cursor.execute("""
                 SELECT u.id, u.username, u.admin_id, a.sub_domain as admin_sub_domain
                 FROM users u
@@ -256,7 +240,8 @@ def generate_subscription_url_mapping(
                 pg_user = pasarguard_user_map_by_id[marz_user_id]
                 match_method = "id"
                 matched_by_id += 1
-                logger.debug(f"Matched user ID {marz_user_id} by ID (username differs: '{username}' vs '{pg_user.get('username')}')")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Matched user ID {marz_user_id} by ID (username differs: '{username}' vs '{pg_user.get('username')}')")
             
             # Generate new Pasarguard URL
             if pg_user:
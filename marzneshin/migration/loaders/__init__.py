@@ -2,9 +2,6 @@
 Loaders module for loading data into Pasarguard database.
 """
 
-from migration.loaders.database import PasarguardLoader
-
-__all__ = ['PasarguardLoader']
-
-
+from migration.loaders.database import PasarguardLoader, TargetColumn
 
+__all__ = ['PasarguardLoader', 'TargetColumn']
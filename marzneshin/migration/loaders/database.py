@@ -4,14 +4,182 @@ Database loader for Pasarguard database.
 
 import json
 import logging
-from typing import Dict, List, Any, Optional
-import pymysql
-from pymysql.cursors import DictCursor
+import os
+import queue
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import groupby
+from typing import Callable, Dict, FrozenSet, Iterator, List, Any, NamedTuple, Optional, Tuple
 
-from migration.config import DatabaseConfig, MIGRATION_CONFIG
+from migration import db
+from migration.config import DatabaseConfig, MIGRATION_CONFIG, get_table_spec
+from migration.models.schemas import (
+    ColumnInfo,
+    ColumnSpec,
+    DEFAULT_NOTIFICATION_ENABLE,
+    MISSING_COLUMNS,
+    build_column_info,
+    load_all_keys
+)
+from migration.utils.helpers import json_dumps
 
 logger = logging.getLogger(__name__)
 
+# Error codes raised when a statement exceeds max_allowed_packet (the server
+# may answer with ER_NET_PACKET_TOO_LARGE or simply drop the connection)
+PACKET_TOO_LARGE_ERRORS = (1153, 2006, 2013)
+
+# Error codes raised when the server or client refuses LOAD DATA LOCAL INFILE
+LOCAL_INFILE_DISABLED_ERRORS = (1148, 2068, 3948)
+
+# Error codes raised when the server can't (or doesn't know how to) run an
+# ALTER TABLE with the requested ALGORITHM/LOCK
+ALTER_ALGORITHM_UNSUPPORTED_ERRORS = (1800, 1845, 1846)
+
+# ALTER TABLE options tried in order for the schema fixups before letting the
+# server choose: INSTANT rewrites no rows, INPLACE avoids a table copy
+ALTER_ALGORITHMS = ("ALGORITHM=INSTANT", "ALGORITHM=INPLACE, LOCK=NONE")
+
+# Tables per UNION ALL query when reading MAX(id) of several tables at once
+MAX_ID_QUERY_CHUNK = 32
+
+# Times a table load is restarted (with halved batches) after its transaction was lost
+MAX_TABLE_RELOADS = 3
+
+# First MySQL version accepting a row alias (INSERT ... AS new ON DUPLICATE KEY UPDATE col = new.col)
+ROW_ALIAS_MIN_VERSION = (8, 0, 19)
+
+
+def _supports_row_alias(server_info: str) -> bool:
+    """Whether a server (by its version string) accepts an INSERT row alias; MariaDB does not."""
+    if 'mariadb' in server_info.lower():
+        return False
+    match = re.match(r'(\d+)\.(\d+)\.(\d+)', server_info)
+    return bool(match) and tuple(int(part) for part in match.groups()) >= ROW_ALIAS_MIN_VERSION
+
+
+@lru_cache(maxsize=4096)
+def _stringify_set(values: FrozenSet[str]) -> str:
+    """Join a set column value in sorted order (cached, identical sets repeat across rows)."""
+    return ','.join(sorted(values))
+
+
+def _prepare_value(value: Any) -> Any:
+    """Convert a row value to an insert parameter (JSON and set columns)."""
+    # Handle JSON fields
+    if isinstance(value, dict):
+        # For JSON columns, ensure the JSON is properly formatted
+        return json_dumps(value, sort_keys=True)  # Sort keys for consistency
+    # Handle set fields (for StringArray columns)
+    if isinstance(value, set):
+        return _stringify_set(frozenset(value)) if value else None
+    return value
+
+
+def _prepare_json(value: Any) -> Any:
+    """Convert a JSON column value to an insert parameter (strings are passed through)."""
+    if value is None or isinstance(value, str):
+        return value
+    return json_dumps(value, sort_keys=True)
+
+
+def _prepare_host_path(value: Any) -> Any:
+    """hosts.path: Pasarguard requires a string, use '/' instead of None or blank."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return "/"
+    return _prepare_value(value)
+
+
+def _prepare_host_status(value: Any) -> Any:
+    """hosts.status: EnumArray is stored as a comma-separated string, '[]' when empty."""
+    if value is None or value == '' or not isinstance(value, str):
+        return '[]'
+    return value
+
+
+def _prepare_notification_enable(value: Any) -> Any:
+    """admins.notification_enable: must be valid JSON, defaults to all notifications off."""
+    if isinstance(value, dict):
+        return json_dumps(value, sort_keys=True)
+    if isinstance(value, str):
+        try:
+            json.loads(value)  # Validate JSON
+        except (json.JSONDecodeError, TypeError):
+            return DEFAULT_NOTIFICATION_ENABLE
+        return value
+    if value is None:
+        return DEFAULT_NOTIFICATION_ENABLE
+    return value
+
+
+# Column-specific transforms; every other column uses _prepare_value
+_COLUMN_TRANSFORMS: Dict[Tuple[str, str], Callable[[Any], Any]] = {
+    ("hosts", "path"): _prepare_host_path,
+    ("hosts", "status"): _prepare_host_status,
+    ("admins", "notification_enable"): _prepare_notification_enable,
+}
+
+# Column types whose values are inserted as they come from the source
+_PASSTHROUGH_TYPES = frozenset({
+    'tinyint', 'smallint', 'mediumint', 'int', 'bigint', 'decimal', 'float', 'double', 'bit',
+    'date', 'datetime', 'timestamp', 'time', 'year',
+})
+
+
+def _replace_column(columns: Dict[str, "TargetColumn"], name: str, old_name: Optional[str], value: "TargetColumn"):
+    """Set a column in an ordered {name: column} map, keeping a renamed column in place."""
+    if old_name and old_name in columns:
+        items = [(name, value) if key == old_name else (key, column) for key, column in columns.items()]
+        columns.clear()
+        columns.update(items)
+    else:
+        columns[name] = value
+
+
+class TargetColumn(NamedTuple):
+    """Column of a target table, as reported by INFORMATION_SCHEMA.COLUMNS."""
+    name: str
+    data_type: str
+    column_type: str
+    is_nullable: bool
+    column_default: Optional[str]
+    extra: str
+    char_length: Optional[int] = None
+    
+    def matches(
+        self,
+        data_type: str,
+        char_length: Optional[int] = None,
+        nullable: bool = True,
+        defaults: Tuple[Optional[str], ...] = (None,)
+    ) -> bool:
+        """
+        Check the column against an expected definition.
+        
+        Args:
+            data_type: Expected DATA_TYPE (lowercase)
+            char_length: Expected CHARACTER_MAXIMUM_LENGTH, None for non-string types
+            nullable: Whether the column should accept NULL
+            defaults: Acceptable column defaults
+            
+        Returns:
+            True if the column matches
+        """
+        return (
+            self.data_type == data_type
+            and self.char_length == char_length
+            and self.is_nullable == nullable
+            and self.column_default in defaults
+        )
+
+
+class _TransactionLost(Exception):
+    """The open transaction was rolled back by the server (connection lost, deadlock)."""
+
 
 class PasarguardLoader:
     """Load data into Pasarguard database."""
@@ -24,27 +192,51 @@ class PasarguardLoader:
             config: Database configuration
         """
         self.config = config
-        self.conn: Optional[pymysql.Connection] = None
+        self.conn: Optional[Any] = None
+        # Cursor shared by all statements of this loader, opened on connect
+        self._cursor: Optional[Any] = None
         self.batch_size = MIGRATION_CONFIG.batch_size
+        # Cleared the first time the server rejects LOAD DATA LOCAL INFILE
+        self.local_infile_supported = True
+        # Whether upserts use a row alias instead of the deprecated VALUES(), set on connect
+        self.row_alias_supported = False
+        # Server max_allowed_packet in bytes, read on connect
+        self.max_packet: Optional[int] = None
+        # Columns of every table, read by get_schema() and reset by DDL (_invalidate_schema)
+        self._schema: Optional[Dict[str, Dict[str, TargetColumn]]] = None
+        # Primary, foreign and unique keys of every table, read by get_keys() and reset with the schema
+        self._keys: Optional[Dict[str, Dict[str, Any]]] = None
+        # Session variables currently overridden for bulk loading, and their original values
+        self.session_variables: Dict[str, int] = {}
+        self._saved_session_variables: Dict[str, int] = {}
+        # Extra loaders (one connection each) lent out by acquire() to migration
+        # workers and reused by add_all_missing_columns, opened lazily
+        self._pool: "queue.Queue[PasarguardLoader]" = queue.Queue()
+        self._pool_loaders: List[PasarguardLoader] = []
+        self._pool_lock = threading.Lock()
     
     def connect(self):
         """Connect to Pasarguard database."""
         try:
             logger.info(f"Connecting to Pasarguard at {self.config.host}:{self.config.port}...")
-            self.conn = pymysql.connect(
-                host=self.config.host,
-                port=self.config.port,
-                user=self.config.user,
-                password=self.config.password,
-                database=self.config.database,
-                charset=self.config.charset,
-                cursorclass=DictCursor,
+            self.conn = db.connect(
+                self.config,
+                autocommit=False,  # One COMMIT per table, not per statement
+                local_infile=True,  # Allow LOAD DATA LOCAL INFILE for bulk_load tables
                 connect_timeout=10,  # 10 second timeout
                 read_timeout=300,  # 5 minute read timeout (for large operations)
                 write_timeout=300  # 5 minute write timeout (for ALTER TABLE operations)
             )
+            self._cursor = self.conn.cursor()
             logger.info(f"✓ Connected to Pasarguard database at {self.config.host}")
-        except pymysql.err.OperationalError as e:
+            cursor = self._cursor
+            cursor.execute("SHOW VARIABLES LIKE 'max_allowed_packet'")
+            result = cursor.fetchone()
+            self.max_packet = int(result['Value']) if result else None
+            self.row_alias_supported = _supports_row_alias(self.conn.get_server_info())
+            if MIGRATION_CONFIG.bulk_mode:
+                self.begin_bulk_session()
+        except db.OperationalError as e:
             logger.error(f"✗ Cannot connect to Pasarguard database:")
             logger.error(f"  Host: {self.config.host}:{self.config.port}")
             logger.error(f"  Database: {self.config.database}")
@@ -56,12 +248,65 @@ class PasarguardLoader:
             raise
     
     def disconnect(self):
-        """Disconnect from database."""
+        """Disconnect from database, restoring the bulk load session variables first."""
+        self._close_pool()
         if self.conn:
+            try:
+                self.end_bulk_session()
+            except db.MySQLError as e:
+                logger.warning(f"Could not restore session settings before disconnecting: {e}")
+            self._cursor.close()
+            self._cursor = None
             self.conn.close()
             self.conn = None
             logger.info("Disconnected from Pasarguard database")
     
+    def begin_bulk_session(self):
+        """
+        Apply MIGRATION_CONFIG.bulk_session_variables to this connection.
+        
+        Each variable is set on its own so a missing privilege (e.g. for
+        sql_log_bin) only skips that variable.
+        """
+        if not self.conn:
+            raise RuntimeError("Not connected to database")
+        
+        cursor = self._cursor
+        for name, value in MIGRATION_CONFIG.bulk_session_variables:
+            try:
+                cursor.execute(f"SELECT @@SESSION.{name} AS value")
+                original = int(cursor.fetchone()['value'])
+                cursor.execute(f"SET SESSION {name} = %s", (value,))
+            except db.MySQLError as e:
+                logger.warning(f"Could not set {name} = {value} for bulk loading: {e}")
+                continue
+            self._saved_session_variables.setdefault(name, original)
+            self.session_variables[name] = value
+        
+        if self.session_variables:
+            settings = ', '.join(f"{name}={value}" for name, value in self.session_variables.items())
+            logger.info(f"Bulk load session enabled ({settings})")
+    
+    def end_bulk_session(self):
+        """Restore the session variables changed by begin_bulk_session."""
+        if not self.conn or not self._saved_session_variables:
+            return
+        
+        cursor = self._cursor
+        for name, value in self._saved_session_variables.items():
+            try:
+                cursor.execute(f"SET SESSION {name} = %s", (value,))
+            except db.MySQLError as e:
+                logger.warning(f"Could not restore {name} = {value}: {e}")
+        
+        self.session_variables.clear()
+        self._saved_session_variables.clear()
+        logger.info("Bulk load session settings restored")
+    
+    def _session_value(self, name: str) -> int:
+        """Current value of a boolean session check (1 unless overridden for bulk loading)."""
+        return self.session_variables.get(name, 1)
+    
     def __enter__(self):
         """Context manager entry."""
         self.connect()
@@ -82,8 +327,8 @@ class PasarguardLoader:
             raise RuntimeError("Not connected to database")
         
         try:
-            with self.conn.cursor() as cursor:
-                cursor.execute(f"TRUNCATE TABLE `{table}`")
+            cursor = self._cursor
+            cursor.execute(f"TRUNCATE TABLE `{table}`")
             self.conn.commit()
             logger.info(f"Cleared table {table}")
         except Exception as e:
@@ -101,26 +346,28 @@ class PasarguardLoader:
         if not self.conn:
             raise RuntimeError("Not connected to database")
         
+        # One cursor for all tables; TRUNCATE commits implicitly and has no multi-table form
+        cursor = self._cursor
         # Disable foreign key checks
-        with self.conn.cursor() as cursor:
-            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
         
         try:
             for table in reversed(tables):
                 try:
-                    self.clear_table(table)
-                except Exception as e:
+                    cursor.execute(f"TRUNCATE TABLE `{table}`")
+                    logger.info(f"Cleared table {table}")
+                except db.MySQLError as e:
                     logger.warning(f"Could not clear {table}: {e}")
         finally:
-            # Re-enable foreign key checks
-            with self.conn.cursor() as cursor:
-                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+            # Re-enable foreign key checks (unless the bulk session keeps them off)
+            cursor.execute(f"SET FOREIGN_KEY_CHECKS = {self._session_value('foreign_key_checks')}")
     
     def load_table(
         self,
         table: str,
         rows: List[Dict[str, Any]],
-        ignore_duplicates: bool = False
+        ignore_duplicates: bool = False,
+        upsert: bool = False
     ) -> tuple[int, int]:
         """
         Load data into a table.
@@ -129,6 +376,8 @@ class PasarguardLoader:
             table: Table name
             rows: List of row dictionaries
             ignore_duplicates: Whether to ignore duplicate key errors
+            upsert: Whether to update existing rows on duplicate keys (takes
+                precedence over ignore_duplicates; disables LOAD DATA)
             
         Returns:
             Tuple of (successful_count, failed_count)
@@ -142,17 +391,80 @@ class PasarguardLoader:
         
         logger.info(f"Loading {len(rows)} rows into {table}")
         
-        success_count = 0
-        fail_count = 0
+        spec = get_table_spec(table)
         
-        # Process in batches
-        for i in range(0, len(rows), self.batch_size):
-            batch = rows[i:i + self.batch_size]
-            batch_success, batch_fail = self._load_batch(
-                table, batch, ignore_duplicates
-            )
-            success_count += batch_success
-            fail_count += batch_fail
+        # Per-table session overrides, reverted once the table is loaded
+        overrides = {}
+        if spec.association:
+            # Association tables only hold references that were validated client-side
+            overrides['foreign_key_checks'] = 0
+        if ignore_duplicates or upsert:
+            # INSERT IGNORE and upserts rely on unique checks to detect duplicates
+            overrides['unique_checks'] = 1
+        overrides = {
+            name: value for name, value in overrides.items()
+            if self._session_value(name) != value
+        }
+        
+        cursor = self._cursor
+        for name, value in overrides.items():
+            cursor.execute(f"SET SESSION {name} = %s", (value,))
+        
+        infile_min_rows = MIGRATION_CONFIG.infile_min_rows
+        use_infile = not upsert and (
+            spec.bulk_load or (infile_min_rows > 0 and len(rows) >= infile_min_rows)
+        )
+        # LOAD DATA takes one column list for the whole file
+        if use_infile and self._common_columns(rows) is None:
+            logger.info(f"Rows of {table} have differing columns, loading with INSERT batches")
+            use_infile = False
+        
+        try:
+            loaded = False
+            if use_infile and self.local_infile_supported:
+                try:
+                    success_count, fail_count = self._load_table_infile(table, rows, ignore_duplicates)
+                    self.conn.commit()
+                    loaded = True
+                except db.MySQLError as e:
+                    self.conn.rollback()
+                    if e.args and e.args[0] in LOCAL_INFILE_DISABLED_ERRORS:
+                        self.local_infile_supported = False
+                        logger.warning(f"LOAD DATA LOCAL INFILE unavailable ({e}), falling back to INSERT batches")
+                    else:
+                        logger.warning(f"LOAD DATA LOCAL INFILE failed for {table} ({e}), retrying with INSERT batches")
+                except Exception:
+                    self.conn.rollback()
+                    raise
+            
+            # All batches of the table share one transaction, committed once at the end.
+            # A lost transaction takes the earlier batches with it, so the table is
+            # loaded again from the first row.
+            batch_size = self._effective_batch_size(table, rows)
+            reloads = 0
+            while not loaded:
+                try:
+                    success_count, fail_count = self._load_batches(
+                        table, rows, ignore_duplicates, batch_size, upsert
+                    )
+                    self.conn.commit()
+                    loaded = True
+                except _TransactionLost as e:
+                    if reloads >= MAX_TABLE_RELOADS:
+                        raise RuntimeError(f"Failed to load {table}: {e}") from e
+                    reloads += 1
+                    batch_size = max(1, batch_size // 2)
+                    logger.warning(f"{e}, reloading {table} in batches of {batch_size} rows")
+                    cursor = self._cursor
+                    for name, value in overrides.items():
+                        cursor.execute(f"SET SESSION {name} = %s", (value,))
+                except Exception:
+                    self.conn.rollback()
+                    raise
+        finally:
+            cursor = self._cursor
+            for name in overrides:
+                cursor.execute(f"SET SESSION {name} = %s", (self._session_value(name),))
         
         logger.info(f"Loaded {success_count}/{len(rows)} rows into {table}")
         if fail_count > 0:
@@ -160,201 +472,546 @@ class PasarguardLoader:
         
         return (success_count, fail_count)
     
+    def acquire(self) -> "PasarguardLoader":
+        """
+        Check out a pooled loader, opening a new connection only if none is idle.
+        
+        Hand it back with release(); the pool keeps its connection open until
+        this loader disconnects, so later callers skip the handshake.
+        
+        Returns:
+            A connected loader for the caller's exclusive use
+        """
+        if not self.conn:
+            raise RuntimeError("Not connected to database")
+        
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        loader = PasarguardLoader(self.config)
+        loader.connect()
+        with self._pool_lock:
+            self._pool_loaders.append(loader)
+        return loader
+    
+    def release(self, loader: "PasarguardLoader"):
+        """
+        Return a loader checked out with acquire() to the pool.
+        
+        Its schema cache is dropped, since the caller may have shared one that
+        later schema changes make stale.
+        
+        Args:
+            loader: Loader returned by acquire()
+        """
+        loader._invalidate_schema()
+        self._pool.put(loader)
+    
+    def _grow_pool(self, size: int):
+        """Open pooled loaders until the pool holds at least ``size`` connections."""
+        while len(self._pool_loaders) < size:
+            loader = PasarguardLoader(self.config)
+            loader.connect()
+            with self._pool_lock:
+                self._pool_loaders.append(loader)
+            self._pool.put(loader)
+    
+    def _close_pool(self):
+        """Disconnect the pooled loaders, including any still checked out."""
+        for loader in self._pool_loaders:
+            loader.disconnect()
+        self._pool_loaders.clear()
+        self._pool = queue.Queue()
+    
+    def _load_batches(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        ignore_duplicates: bool,
+        batch_size: int,
+        upsert: bool = False
+    ) -> tuple[int, int]:
+        """
+        Insert rows in batches, each sent as one multi-row INSERT, without committing.
+        
+        Args:
+            table: Table name
+            rows: List of row dictionaries
+            ignore_duplicates: Whether to ignore duplicate key errors
+            batch_size: Rows per batch
+            upsert: Whether to update existing rows on duplicate keys
+            
+        Returns:
+            Tuple of (successful_count, failed_count)
+        """
+        success_count = 0
+        fail_count = 0
+        
+        # Rows of one source table normally share the same keys; otherwise every
+        # run of rows with the same keys gets an INSERT of its own
+        columns = self._common_columns(rows)
+        
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            if columns is not None:
+                parts = [(columns, batch)]
+            else:
+                parts = [
+                    (keys, list(part))
+                    for keys, part in groupby(batch, key=lambda row: tuple(row.keys()))
+                ]
+            for part_columns, part in parts:
+                batch_success, batch_fail = self._load_batch(
+                    table, part, ignore_duplicates, part_columns, upsert
+                )
+                success_count += batch_success
+                fail_count += batch_fail
+        
+        return (success_count, fail_count)
+    
+    @staticmethod
+    def _common_columns(rows: List[Dict[str, Any]]) -> Optional[Tuple[str, ...]]:
+        """
+        Get the columns of the rows if every row has the same keys.
+        
+        Args:
+            rows: List of row dictionaries
+            
+        Returns:
+            The shared columns (in the first row's order), or None if the keys differ
+        """
+        first = rows[0].keys()
+        if all(row.keys() == first for row in rows):
+            return tuple(first)
+        return None
+    
+    def _effective_batch_size(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """
+        Fit the batch size to max_allowed_packet.
+        
+        The row size is estimated from the JSON length of a few sample rows, and
+        a batch is kept under 80% of the packet limit. self.batch_size remains
+        the upper bound.
+        
+        Args:
+            table: Table name (for logging)
+            rows: Rows to be loaded
+            
+        Returns:
+            Number of rows per batch
+        """
+        if not self.max_packet:
+            return self.batch_size
+        
+        step = max(1, len(rows) // 8)
+        row_bytes = max(len(json.dumps(row, default=str)) for row in rows[::step][:8])
+        batch_size = min(self.batch_size, max(1, int(self.max_packet * 0.8 / row_bytes)))
+        if batch_size < self.batch_size:
+            logger.debug(f"Using batches of {batch_size} rows for {table} (~{row_bytes} bytes per row)")
+        return batch_size
+    
+    def _load_table_infile(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        ignore_duplicates: bool = False
+    ) -> tuple[int, int]:
+        """
+        Load rows through a temporary TSV file and LOAD DATA LOCAL INFILE, without committing.
+        
+        LOCAL implies IGNORE: rows the server rejects are skipped with a warning,
+        so they are counted as failed from the affected row count.
+        
+        Args:
+            table: Table name
+            rows: List of row dictionaries
+            ignore_duplicates: Whether to skip rows with duplicate keys
+            
+        Returns:
+            Tuple of (successful_count, failed_count)
+        """
+        columns = tuple(rows[0].keys())
+        transforms = self._make_column_transforms(table, columns)
+        format_value = self._format_infile_value
+        
+        tmp = tempfile.NamedTemporaryFile(
+            mode='w', encoding='utf-8', newline='', suffix='.tsv', delete=False
+        )
+        try:
+            with tmp:
+                for values in self._iter_row_values(rows, columns, transforms):
+                    tmp.write('\t'.join([format_value(value) for value in values]))
+                    tmp.write('\n')
+            
+            escaped_columns = ', '.join(f"`{col}`" for col in columns)
+            ignore = "IGNORE " if ignore_duplicates else ""
+            sql = (
+                f"LOAD DATA LOCAL INFILE %s {ignore}INTO TABLE `{table}` "
+                f"CHARACTER SET utf8mb4 "
+                f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+                f"LINES TERMINATED BY '\\n' "
+                f"({escaped_columns})"
+            )
+            
+            cursor = self._cursor
+            cursor.execute(sql, (tmp.name,))
+            success_count = max(0, cursor.rowcount)
+            if success_count < len(rows):
+                # Read before any other statement replaces the warnings
+                self._log_load_warnings(table)
+        finally:
+            os.unlink(tmp.name)
+        
+        return (success_count, len(rows) - success_count)
+    
+    def _log_load_warnings(self, table: str, limit: int = 10):
+        """
+        Log the warnings of the last statement (e.g. rows skipped by LOAD DATA).
+        
+        Args:
+            table: Table name (for logging)
+            limit: Maximum number of warnings logged
+        """
+        cursor = self._cursor
+        try:
+            cursor.execute(f"SHOW WARNINGS LIMIT {int(limit)}")
+            warnings = cursor.fetchall()
+        except db.MySQLError as e:
+            logger.warning(f"Could not read warnings for {table}: {e}")
+            return
+        for warning in warnings:
+            logger.warning(f"  {table}: {warning['Level']} {warning['Code']}: {warning['Message']}")
+    
+    @staticmethod
+    def _format_infile_value(value: Any) -> str:
+        """
+        Format an insert parameter as a LOAD DATA field (backslash-escaped, \\N for NULL).
+        
+        Values are expected to have gone through the column transforms already,
+        so JSON and set columns arrive as strings.
+        """
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return '1' if value else '0'
+        if isinstance(value, (datetime, date)):
+            return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return (
+            str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r')
+            .replace('\0', '\\0')
+        )
+    
     def _load_batch(
         self,
         table: str,
         batch: List[Dict[str, Any]],
-        ignore_duplicates: bool = False
+        ignore_duplicates: bool = False,
+        columns: Optional[Tuple[str, ...]] = None,
+        upsert: bool = False
     ) -> tuple[int, int]:
-        """Load a batch of rows."""
+        """
+        Load a batch of rows inside the table's transaction.
+        
+        The batch is guarded by a savepoint: if it fails, only the batch is rolled
+        back and retried by halves.
+        """
         if not batch:
             return (0, 0)
         
         # Get columns from first row
-        columns = list(batch[0].keys())
+        if columns is None:
+            columns = tuple(batch[0].keys())
         
         # Build INSERT query
-        sql = self._build_insert_query(table, columns, ignore_duplicates)
+        sql = self._build_insert_query(table, columns, ignore_duplicates, upsert, self.row_alias_supported)
         
-        # Convert rows to tuples, handling special types
-        values = []
-        for row in batch:
-            row_values = []
-            for col in columns:
-                value = row.get(col)
-                # Special handling for hosts.path - Pasarguard requires string, not None
-                # Use '/' as default instead of empty string to avoid None conversion issues
-                if table == "hosts" and col == "path" and (value is None or (isinstance(value, str) and not value.strip())):
-                    value = "/"
-                # Special handling for hosts.status - EnumArray requires '[]' for empty, not empty string
-                elif table == "hosts" and col == "status":
-                    if value is None or value == '':
-                        value = '[]'  # Empty array string representation for EnumArray
-                    # Ensure it's a string (EnumArray is stored as comma-separated string)
-                    elif not isinstance(value, str):
-                        value = '[]'  # Default to empty array if not a string
-                # Special handling for notification_enable - ensure it's a valid JSON string
-                elif table == "admins" and col == "notification_enable":
-                    if isinstance(value, dict):
-                        value = json.dumps(value, sort_keys=True)
-                    elif isinstance(value, str):
-                        # Validate it's valid JSON
-                        try:
-                            json.loads(value)  # Validate JSON
-                        except (json.JSONDecodeError, TypeError):
-                            # If invalid, use default
-                            value = json.dumps({
-                                "create": False,
-                                "modify": False,
-                                "delete": False,
-                                "status_change": False,
-                                "reset_data_usage": False,
-                                "data_reset_by_next": False,
-                                "subscription_revoked": False
-                            }, sort_keys=True)
-                    elif value is None:
-                        # Use default if None
-                        value = json.dumps({
-                            "create": False,
-                            "modify": False,
-                            "delete": False,
-                            "status_change": False,
-                            "reset_data_usage": False,
-                            "data_reset_by_next": False,
-                            "subscription_revoked": False
-                        }, sort_keys=True)
-                # Handle JSON fields
-                elif isinstance(value, dict):
-                    # For JSON columns, ensure the JSON is properly formatted
-                    # PyMySQL will handle the conversion, but we need valid JSON string
-                    value = json.dumps(value, sort_keys=True)  # Sort keys for consistency
-                # Handle set fields (for StringArray columns)
-                elif isinstance(value, set):
-                    value = ','.join(sorted(value)) if value else None
-                row_values.append(value)
-            values.append(tuple(row_values))
+        # Convert values straight into one flat parameter list, handling special types
+        transforms = self._make_column_transforms(table, columns)
+        params = self._flatten_row_values(batch, columns, transforms)
+        
+        with self.conn.cursor() as cursor:
+            cursor.execute("SAVEPOINT migration_batch")
         
         try:
-            with self.conn.cursor() as cursor:
-                cursor.executemany(sql, values)
-            self.conn.commit()
+            try:
+                # One INSERT ... VALUES (...), (...), ... statement for the whole batch
+                with self.conn.cursor() as cursor:
+                    cursor.execute(
+                        self._build_multirow_insert_query(
+                            table, columns, ignore_duplicates, len(batch), upsert,
+                            self.row_alias_supported
+                        ),
+                        params
+                    )
+            except db.MySQLError as e:
+                if not e.args or e.args[0] not in PACKET_TOO_LARGE_ERRORS:
+                    raise
+                logger.warning(
+                    f"Batch of {len(batch)} rows for {table} exceeds max_allowed_packet, "
+                    f"retrying as smaller statements"
+                )
+                del params
+                self._rollback_to_savepoint("migration_batch")
+                # executemany splits the rows into statements below max_stmt_length
+                with self.conn.cursor() as cursor:
+                    cursor.executemany(sql, self._iter_row_values(batch, columns, transforms))
             return (len(batch), 0)
             
+        except _TransactionLost:
+            raise
         except Exception as e:
-            self.conn.rollback()
+            self._rollback_to_savepoint("migration_batch")
             logger.warning(f"Batch insert failed for {table}: {e}")
             
-            # Retry row by row
-            return self._retry_batch_row_by_row(table, batch, sql)
+            # Retry by halves to isolate the failing rows
+            return self._retry_bisect(table, batch, ignore_duplicates, columns, transforms, upsert)
     
-    def _retry_batch_row_by_row(
+    def _retry_bisect(
         self,
         table: str,
         batch: List[Dict[str, Any]],
-        sql: str
+        ignore_duplicates: bool,
+        columns: Tuple[str, ...],
+        transforms: List[Optional[Callable[[Any], Any]]],
+        upsert: bool = False
     ) -> tuple[int, int]:
-        """Retry failed batch row by row."""
+        """
+        Retry a failed batch by splitting it in halves until the bad rows are isolated.
+        
+        Each part is inserted as one multi-row INSERT under a savepoint; a part
+        that fails is split again, and only single rows are counted as failed.
+        A batch with one bad row takes O(log n) statements instead of n.
+        
+        Returns:
+            Tuple of (successful_count, failed_count)
+        """
         success_count = 0
         fail_count = 0
         
-        columns = list(batch[0].keys())
-        
-        for row in batch:
-            # Handle special types (JSON, sets)
-            row_values = []
-            for col in columns:
-                value = row.get(col)
-                # Special handling for hosts.path - Pasarguard requires string, not None
-                # Use '/' as default instead of empty string to avoid None conversion issues
-                if table == "hosts" and col == "path" and (value is None or (isinstance(value, str) and not value.strip())):
-                    value = "/"
-                # Special handling for hosts.status - EnumArray requires '[]' for empty, not empty string
-                elif table == "hosts" and col == "status":
-                    if value is None or value == '':
-                        value = '[]'  # Empty array string representation for EnumArray
-                    # Ensure it's a string (EnumArray is stored as comma-separated string)
-                    elif not isinstance(value, str):
-                        value = '[]'  # Default to empty array if not a string
-                # Special handling for notification_enable - ensure it's a valid JSON string
-                elif table == "admins" and col == "notification_enable":
-                    if isinstance(value, dict):
-                        value = json.dumps(value, sort_keys=True)
-                    elif isinstance(value, str):
-                        # Validate it's valid JSON
-                        try:
-                            json.loads(value)  # Validate JSON
-                        except (json.JSONDecodeError, TypeError):
-                            # If invalid, use default
-                            value = json.dumps({
-                                "create": False,
-                                "modify": False,
-                                "delete": False,
-                                "status_change": False,
-                                "reset_data_usage": False,
-                                "data_reset_by_next": False,
-                                "subscription_revoked": False
-                            }, sort_keys=True)
-                    elif value is None:
-                        # Use default if None
-                        value = json.dumps({
-                            "create": False,
-                            "modify": False,
-                            "delete": False,
-                            "status_change": False,
-                            "reset_data_usage": False,
-                            "data_reset_by_next": False,
-                            "subscription_revoked": False
-                        }, sort_keys=True)
-                # Handle JSON fields
-                elif isinstance(value, dict):
-                    # For JSON columns, ensure the JSON is properly formatted
-                    # PyMySQL will handle the conversion, but we need valid JSON string
-                    value = json.dumps(value, sort_keys=True)  # Sort keys for consistency
-                # Handle set fields (for StringArray columns)
-                elif isinstance(value, set):
-                    value = ','.join(sorted(value)) if value else None
-                row_values.append(value)
-            values = tuple(row_values)
-            
+        # Stack of parts still to insert, first half on top
+        mid = len(batch) // 2
+        pending = [batch[mid:], batch[:mid]] if mid else [batch]
+        while pending:
+            part = pending.pop()
             try:
                 with self.conn.cursor() as cursor:
-                    cursor.execute(sql, values)
-                self.conn.commit()
-                success_count += 1
+                    cursor.execute("SAVEPOINT migration_retry")
+                    cursor.execute(
+                        self._build_multirow_insert_query(
+                            table, columns, ignore_duplicates, len(part), upsert,
+                            self.row_alias_supported
+                        ),
+                        self._flatten_row_values(part, columns, transforms)
+                    )
+                success_count += len(part)
                 
             except Exception as e:
-                self.conn.rollback()
-                fail_count += 1
+                self._rollback_to_savepoint("migration_retry")
                 
+                if len(part) > 1:
+                    mid = len(part) // 2
+                    pending.append(part[mid:])
+                    pending.append(part[:mid])
+                    continue
+                
+                fail_count += 1
                 if fail_count <= 3:  # Log first 3 errors
                     logger.error(f"Failed to insert row in {table}: {e}")
-                    logger.debug(f"Failed row: {row}")
+                    logger.debug(f"Failed row: {part[0]}")
         
         return (success_count, fail_count)
     
-    def _build_insert_query(
+    def _make_column_transforms(
         self,
         table: str,
-        columns: List[str],
-        ignore_duplicates: bool = False
+        columns: Tuple[str, ...]
+    ) -> List[Optional[Callable[[Any], Any]]]:
+        """
+        Get the value transform for each column, resolved once per batch.
+        
+        The transform follows the target column type: JSON columns are always
+        serialized, numeric and temporal columns are passed through (None), and
+        other columns, or columns of unknown type, go through _prepare_value.
+        
+        Args:
+            table: Table name
+            columns: Column names in insert order
+            
+        Returns:
+            List of functions converting a row value to an insert parameter,
+            None where the value is used as is
+        """
+        column_types = self._get_column_types(table)
+        transforms = []
+        for col in columns:
+            transform = _COLUMN_TRANSFORMS.get((table, col))
+            if transform is None:
+                data_type = column_types.get(col)
+                if data_type == 'json':
+                    transform = _prepare_json
+                elif data_type not in _PASSTHROUGH_TYPES:
+                    transform = _prepare_value
+            transforms.append(transform)
+        return transforms
+    
+    def _get_column_types(self, table: str) -> Dict[str, str]:
+        """
+        Get the data type of every column of a target table.
+        
+        Args:
+            table: Table name
+            
+        Returns:
+            Dictionary mapping column name to lowercase DATA_TYPE, empty if unknown
+        """
+        return {
+            name: column.data_type
+            for name, column in self.get_schema().get(table, {}).items()
+        }
+    
+    @staticmethod
+    def _rows_match_columns(batch: List[Dict[str, Any]], columns: Tuple[str, ...]) -> bool:
+        """Check that every row has exactly ``columns`` as keys, in that order."""
+        return all(map(columns.__eq__, map(tuple, batch)))
+    
+    @staticmethod
+    def _flatten_row_values(
+        batch: List[Dict[str, Any]],
+        columns: Tuple[str, ...],
+        transforms: List[Optional[Callable[[Any], Any]]]
+    ) -> List[Any]:
+        """Convert rows to one flat parameter list for a multi-row INSERT."""
+        if PasarguardLoader._rows_match_columns(batch, columns):
+            # Key order matches the column order: read values positionally
+            return [
+                value if transform is None else transform(value)
+                for row in batch
+                for transform, value in zip(transforms, row.values())
+            ]
+        return [
+            row.get(col) if transform is None else transform(row.get(col))
+            for row in batch
+            for transform, col in zip(transforms, columns)
+        ]
+    
+    @staticmethod
+    def _iter_row_values(
+        batch: List[Dict[str, Any]],
+        columns: Tuple[str, ...],
+        transforms: List[Optional[Callable[[Any], Any]]]
+    ) -> Iterator[Tuple[Any, ...]]:
+        """Lazily convert rows to insert parameter tuples."""
+        if PasarguardLoader._rows_match_columns(batch, columns):
+            # Key order matches the column order: read values positionally
+            for row in batch:
+                yield tuple(
+                    value if transform is None else transform(value)
+                    for transform, value in zip(transforms, row.values())
+                )
+            return
+        for row in batch:
+            yield tuple(
+                row.get(col) if transform is None else transform(row.get(col))
+                for transform, col in zip(transforms, columns)
+            )
+    
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _build_insert_query(
+        table: str,
+        columns: Tuple[str, ...],
+        ignore_duplicates: bool = False,
+        upsert: bool = False,
+        row_alias: bool = False
+    ) -> str:
+        """
+        Build INSERT query (cached per table, column tuple and duplicate handling).
+        
+        Statements take positional %s parameters in ``columns`` order; pass a
+        tuple of values rather than a dict with %(name)s placeholders.
+        """
+        return PasarguardLoader._build_multirow_insert_query(
+            table, columns, ignore_duplicates, 1, upsert, row_alias
+        )
+    
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _build_multirow_insert_query(
+        table: str,
+        columns: Tuple[str, ...],
+        ignore_duplicates: bool,
+        row_count: int,
+        upsert: bool = False,
+        row_alias: bool = False
     ) -> str:
-        """Build INSERT query."""
-        escaped_table = f"`{table}`"
+        """
+        Build an INSERT query with a VALUES list for ``row_count`` rows (cached, full batches repeat).
+        
+        With ``upsert``, rows whose key already exists update every non-primary-key
+        column (ON DUPLICATE KEY UPDATE) instead of being skipped or failing. The
+        new values are referenced through a row alias when ``row_alias`` is set
+        (MySQL 8.0.19+), and through VALUES(), deprecated since 8.0.20, otherwise.
+        
+        Batches are sent as plain multi-row statements rather than server-side
+        prepared statements: neither PyMySQL nor mysqlclient exposes the binary
+        protocol, and SQL-level PREPARE/EXECUTE needs one user variable per
+        parameter, which costs more than the single statement it would replace.
+        """
         escaped_columns = [f"`{col}`" for col in columns]
-        placeholders = ", ".join(["%s"] * len(columns))
+        row_placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        ignore = "IGNORE " if ignore_duplicates and not upsert else ""
+        sql = (
+            f"INSERT {ignore}INTO `{table}` "
+            f"({', '.join(escaped_columns)}) "
+            f"VALUES " + ", ".join([row_placeholders] * row_count)
+        )
         
-        if ignore_duplicates:
-            return (
-                f"INSERT IGNORE INTO {escaped_table} "
-                f"({', '.join(escaped_columns)}) "
-                f"VALUES ({placeholders})"
-            )
-        else:
-            return (
-                f"INSERT INTO {escaped_table} "
-                f"({', '.join(escaped_columns)}) "
-                f"VALUES ({placeholders})"
-            )
+        if upsert:
+            pk = get_table_spec(table).pk
+            # A row of only the primary key still needs one (no-op) assignment
+            updates = [col for col in escaped_columns if col != f"`{pk}`"] or escaped_columns[:1]
+            if row_alias:
+                sql += " AS `new` ON DUPLICATE KEY UPDATE " + ", ".join(f"{col} = `new`.{col}" for col in updates)
+            else:
+                sql += " ON DUPLICATE KEY UPDATE " + ", ".join(f"{col} = VALUES({col})" for col in updates)
+        
+        return sql
+    
+    def _rollback_to_savepoint(self, savepoint: str):
+        """
+        Undo the statements since a savepoint, keeping the rest of the transaction.
+        
+        If the savepoint is gone, the server has already rolled back the whole
+        transaction (connection closed, deadlock). The connection is then
+        re-established with the bulk session variables applied again, and
+        _TransactionLost is raised so the caller can reload the table.
+        
+        Args:
+            savepoint: Savepoint name
+        """
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {savepoint}")
+            return
+        except db.MySQLError as e:
+            error = e  # Transaction lost, reconnect below
+        
+        try:
+            self.conn.rollback()
+        except db.MySQLError:
+            pass
+        self.conn.ping(True)
+        with self.conn.cursor() as cursor:
+            for name, value in self.session_variables.items():
+                cursor.execute(f"SET SESSION {name} = %s", (value,))
+        raise _TransactionLost(f"Transaction rolled back by the server ({error})")
     
     def get_max_id(self, table: str, id_column: str = 'id') -> int:
         """
@@ -370,10 +1027,39 @@ class PasarguardLoader:
         if not self.conn:
             raise RuntimeError("Not connected to database")
         
-        with self.conn.cursor() as cursor:
-            cursor.execute(f"SELECT MAX(`{id_column}`) as max_id FROM `{table}`")
-            result = cursor.fetchone()
-            return result['max_id'] if result and result['max_id'] else 0
+        cursor = self._cursor
+        cursor.execute(f"SELECT MAX(`{id_column}`) as max_id FROM `{table}`")
+        result = cursor.fetchone()
+        return result['max_id'] if result and result['max_id'] else 0
+    
+    def get_max_ids(self, id_columns: Dict[str, str]) -> Dict[str, int]:
+        """
+        Get the maximum ID of several tables with UNION ALL queries.
+        
+        Args:
+            id_columns: Dictionary mapping table name to ID column name
+            
+        Returns:
+            Dictionary mapping table name to maximum ID (0 for empty tables)
+        """
+        if not self.conn:
+            raise RuntimeError("Not connected to database")
+        
+        max_ids = {}
+        items = list(id_columns.items())
+        cursor = self._cursor
+        for i in range(0, len(items), MAX_ID_QUERY_CHUNK):
+            chunk = items[i:i + MAX_ID_QUERY_CHUNK]
+            cursor.execute(
+                " UNION ALL ".join(
+                    f"SELECT %s AS table_name, MAX(`{column}`) AS max_id FROM `{table}`"
+                    for table, column in chunk
+                ),
+                [table for table, _ in chunk]
+            )
+            for row in cursor.fetchall():
+                max_ids[row['table_name']] = row['max_id'] or 0
+        return max_ids
     
     def reset_auto_increment(self, table: str, id_column: str = 'id'):
         """
@@ -386,16 +1072,27 @@ class PasarguardLoader:
         if not self.conn:
             raise RuntimeError("Not connected to database")
         
-        max_id = self.get_max_id(table, id_column)
+        self._set_auto_increment(table, id_column, self.get_max_id(table, id_column))
+    
+    def _set_auto_increment(self, table: str, id_column: str, max_id: int):
+        """
+        Move a table's auto-increment counter past its maximum ID.
+        
+        ALTER TABLE commits implicitly, so no COMMIT is sent.
+        
+        Args:
+            table: Table name
+            id_column: ID column name
+            max_id: Current maximum ID of the table
+        """
         if max_id > 0:
             next_id = max_id + 1
             
             try:
-                with self.conn.cursor() as cursor:
-                    cursor.execute(f"ALTER TABLE `{table}` AUTO_INCREMENT = {next_id}")
-                self.conn.commit()
+                cursor = self._cursor
+                cursor.execute(f"ALTER TABLE `{table}` AUTO_INCREMENT = {next_id}")
                 logger.info(f"Reset auto-increment for {table}.{id_column} to {next_id}")
-            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+            except db.OperationalError + db.InterfaceError as e:
                 # Connection lost - try to reconnect and continue
                 try:
                     if self.conn:
@@ -405,7 +1102,7 @@ class PasarguardLoader:
                 logger.warning(f"Failed to reset auto-increment for {table}: {e}")
                 # Try to reconnect
                 try:
-                    self.conn.ping(reconnect=True)
+                    self.conn.ping(True)
                 except:
                     logger.warning(f"Could not reconnect for {table}, skipping...")
             except Exception as e:
@@ -415,29 +1112,184 @@ class PasarguardLoader:
                     pass
                 logger.warning(f"Failed to reset auto-increment for {table}: {e}")
     
-    def reset_all_auto_increments(self):
-        """Reset auto-increment for all tables with auto-increment columns."""
+    def reset_all_auto_increments(self):
+        """Reset auto-increment for all tables with auto-increment columns."""
+        if not self.conn:
+            raise RuntimeError("Not connected to database")
+        
+        id_columns = {
+            table: column.name
+            for table, columns in self.get_schema().items()
+            for column in columns.values()
+            if 'auto_increment' in column.extra
+        }
+        
+        # One MAX() query per chunk of tables, then one ALTER TABLE per table
+        max_ids = self.get_max_ids(id_columns)
+        for table, column in id_columns.items():
+            self._set_auto_increment(table, column, max_ids.get(table, 0))
+    
+    def get_schema(self) -> Dict[str, Dict[str, TargetColumn]]:
+        """
+        Get the columns of every table in the database.
+        
+        Read with a single INFORMATION_SCHEMA query the first time it is needed
+        and kept until DDL run by this loader invalidates it.
+        
+        Returns:
+            Dictionary of {table: {column name: column}} in ordinal order
+        """
+        if not self.conn:
+            raise RuntimeError("Not connected to database")
+        
+        if self._schema is None:
+            schema: Dict[str, Dict[str, TargetColumn]] = {}
+            # MariaDB reports a NULL default as 'NULL' and quotes string literals
+            # in COLUMN_DEFAULT; normalize to what DESCRIBE shows
+            mariadb = 'mariadb' in self.conn.get_server_info().lower()
+            # Unbuffered tuple cursor: rows are turned into TargetColumns as they
+            # arrive instead of first being materialized as a list of dicts
+            with db.stream_cursor(self.conn) as cursor:
+                cursor.execute("""
+                    SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE, c.COLUMN_TYPE,
+                           c.IS_NULLABLE, c.COLUMN_DEFAULT, c.EXTRA, c.CHARACTER_MAXIMUM_LENGTH
+                    FROM INFORMATION_SCHEMA.COLUMNS c
+                    JOIN INFORMATION_SCHEMA.TABLES t
+                        ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+                    WHERE c.TABLE_SCHEMA = DATABASE()
+                    AND t.TABLE_TYPE = 'BASE TABLE'
+                    ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION
+                """)
+                for table, name, data_type, column_type, nullable, default, extra, char_length in cursor:
+                    if mariadb and default is not None:
+                        if default == 'NULL':
+                            default = None
+                        elif len(default) >= 2 and default[0] == default[-1] == "'":
+                            default = default[1:-1].replace("''", "'")
+                    schema.setdefault(table, {})[name] = TargetColumn(
+                        name=name,
+                        data_type=data_type.lower(),
+                        column_type=column_type,
+                        is_nullable=nullable == 'YES',
+                        column_default=default,
+                        extra=(extra or '').lower(),
+                        char_length=char_length
+                    )
+            self._schema = schema
+        return self._schema
+    
+    def get_column_infos(self) -> Dict[str, Dict[str, ColumnInfo]]:
+        """
+        Get the schema as ColumnInfo records, as used by the converter and validator.
+        
+        Built from get_schema(), so it costs no INFORMATION_SCHEMA query of its own.
+        
+        Returns:
+            Dictionary of {table: {column name: ColumnInfo}}
+        """
+        return {
+            table: {
+                name: build_column_info(
+                    data_type=column.data_type,
+                    column_type=column.column_type,
+                    nullable=column.is_nullable,
+                    default=column.column_default,
+                    max_length=column.char_length,
+                    extra=column.extra
+                )
+                for name, column in columns.items()
+            }
+            for table, columns in self.get_schema().items()
+        }
+    
+    def _cache_column(
+        self,
+        table: str,
+        column: str,
+        col_type: str,
+        nullable: bool,
+        default: Optional[str] = None,
+        old_name: Optional[str] = None
+    ):
+        """
+        Record a column added or changed by ALTER TABLE in the cached schema.
+        
+        Keeps get_schema() valid across the fixups without re-reading INFORMATION_SCHEMA.
+        
+        Args:
+            table: Table name
+            column: Column name after the change
+            col_type: Column type as COLUMN_TYPE reports it (lowercase)
+            nullable: Whether the column accepts NULL
+            default: Column default, None for no default
+            old_name: Previous name of a renamed column
+        """
+        if self._schema is None or table not in self._schema:
+            return
+        data_type, _, length = col_type.partition('(')
+        _replace_column(self._schema[table], column, old_name, TargetColumn(
+            name=column,
+            data_type=data_type,
+            column_type=col_type,
+            is_nullable=nullable,
+            column_default=default,
+            extra='',
+            char_length=int(length[:-1]) if data_type in ('char', 'varchar') else None
+        ))
+    
+    def get_keys(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the primary, foreign and unique keys of every table.
+        
+        Read with a single KEY_COLUMN_USAGE query (load_all_keys) the first time
+        it is needed and kept until DDL run by this loader invalidates it.
+        
+        Returns:
+            Dictionary of {table: {'pk': ..., 'fks': {column: referenced_table}, 'unique': [...]}}
+        """
         if not self.conn:
             raise RuntimeError("Not connected to database")
         
-        with self.conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT TABLE_NAME, COLUMN_NAME
-                FROM INFORMATION_SCHEMA.COLUMNS
-                WHERE TABLE_SCHEMA = DATABASE()
-                AND EXTRA LIKE '%auto_increment%'
-            """)
-            
-            tables = cursor.fetchall()
+        if self._keys is None:
+            self._keys = load_all_keys(self.conn)
+        return self._keys
+    
+    def share_schema(
+        self,
+        schema: Dict[str, Dict[str, TargetColumn]],
+        keys: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        """
+        Use a schema already read by another loader on the same database.
+        
+        Saves each extra connection its own INFORMATION_SCHEMA queries. The schema is
+        shared until this loader runs DDL, which drops only its own reference.
+        
+        Args:
+            schema: Result of get_schema() on the other loader
+            keys: Result of get_keys() on the other loader, if it was read
+        """
+        self._schema = schema
+        if keys is not None:
+            self._keys = keys
+    
+    def _invalidate_schema(self):
+        """Drop the cached schema and keys after DDL (CREATE, ALTER, DROP TABLE)."""
+        self._schema = None
+        self._keys = None
+    
+    def list_tables(self) -> FrozenSet[str]:
+        """
+        Get the names of all tables in the database (from the cached schema).
         
-        for row in tables:
-            table = row['TABLE_NAME']
-            column = row['COLUMN_NAME']
-            self.reset_auto_increment(table, column)
+        Returns:
+            Frozenset of table names
+        """
+        return frozenset(self.get_schema())
     
     def table_exists(self, table: str) -> bool:
         """
-        Check if table exists.
+        Check if table exists (a dict lookup in the cached schema).
         
         Args:
             table: Table name
@@ -445,19 +1297,7 @@ class PasarguardLoader:
         Returns:
             True if exists
         """
-        if not self.conn:
-            raise RuntimeError("Not connected to database")
-        
-        with self.conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT COUNT(*) as count
-                FROM INFORMATION_SCHEMA.TABLES
-                WHERE TABLE_SCHEMA = DATABASE()
-                AND TABLE_NAME = %s
-            """, (table,))
-            
-            result = cursor.fetchone()
-            return result['count'] > 0 if result else False
+        return table in self.get_schema()
     
     def get_alembic_version(self) -> Optional[str]:
         """
@@ -474,10 +1314,10 @@ class PasarguardLoader:
             return None
         
         try:
-            with self.conn.cursor() as cursor:
-                cursor.execute("SELECT version_num FROM alembic_version LIMIT 1")
-                result = cursor.fetchone()
-                return result['version_num'] if result else None
+            cursor = self._cursor
+            cursor.execute("SELECT version_num FROM alembic_version LIMIT 1")
+            result = cursor.fetchone()
+            return result['version_num'] if result else None
         except Exception as e:
             logger.warning(f"Failed to get Alembic version: {e}")
             return None
@@ -500,11 +1340,11 @@ class PasarguardLoader:
             return
         
         try:
-            with self.conn.cursor() as cursor:
-                # Delete existing version
-                cursor.execute("DELETE FROM alembic_version")
-                # Insert new version
-                cursor.execute("INSERT INTO alembic_version (version_num) VALUES (%s)", (version,))
+            cursor = self._cursor
+            # Delete existing version
+            cursor.execute("DELETE FROM alembic_version")
+            # Insert new version
+            cursor.execute("INSERT INTO alembic_version (version_num) VALUES (%s)", (version,))
             self.conn.commit()
             logger.info(f"Updated Alembic version to {version}")
         except Exception as e:
@@ -519,19 +1359,83 @@ class PasarguardLoader:
         Returns:
             List of table names
         """
+        return list(self.get_schema())
+    
+    def drop_secondary_indexes(self, table: str) -> List[str]:
+        """
+        Drop the non-unique secondary indexes of a table ahead of a bulk load.
+        
+        Primary keys and unique indexes are kept so duplicate handling still
+        works. Indexes backing a foreign key, full-text, spatial and functional
+        indexes, and any index the server refuses to drop are left in place.
+        
+        Args:
+            table: Table name
+            
+        Returns:
+            ADD INDEX clauses recreating the dropped indexes, for restore_secondary_indexes()
+        """
         if not self.conn:
             raise RuntimeError("Not connected to database")
         
-        with self.conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT TABLE_NAME
-                FROM INFORMATION_SCHEMA.TABLES
-                WHERE TABLE_SCHEMA = DATABASE()
-                AND TABLE_TYPE = 'BASE TABLE'
-            """)
-            
-            results = cursor.fetchall()
-            return [row['TABLE_NAME'] for row in results]
+        table_keys = self.get_keys().get(table)
+        fk_columns = set(table_keys['fks']) if table_keys else set()
+        
+        cursor = self._cursor
+        cursor.execute(f"SHOW INDEX FROM `{table}`")
+        
+        indexes: Dict[str, List[str]] = {}
+        skipped = set()
+        for row in cursor.fetchall():
+            name = row['Key_name']
+            if name == 'PRIMARY' or not int(row['Non_unique']):
+                continue
+            if (
+                row.get('Index_type') not in ('BTREE', 'HASH')
+                or row.get('Expression')
+                or not row['Column_name']
+                or (int(row['Seq_in_index']) == 1 and row['Column_name'] in fk_columns)
+            ):
+                skipped.add(name)
+                continue
+            part = f"`{row['Column_name']}`"
+            if row.get('Sub_part'):
+                part += f"({row['Sub_part']})"
+            if row.get('Collation') == 'D':
+                part += " DESC"
+            indexes.setdefault(name, []).append(part)
+        
+        clauses = []
+        for name, parts in indexes.items():
+            if name in skipped:
+                continue
+            try:
+                cursor.execute(f"ALTER TABLE `{table}` DROP INDEX `{name}`")
+            except db.MySQLError as e:
+                logger.debug(f"Keeping index {table}.{name} during load: {e}")
+                continue
+            clauses.append(f"ADD INDEX `{name}` ({', '.join(parts)})")
+        
+        if clauses:
+            logger.info(f"  Deferred {len(clauses)} secondary indexes on {table}")
+        return clauses
+    
+    def restore_secondary_indexes(self, table: str, clauses: List[str]):
+        """
+        Recreate indexes dropped by drop_secondary_indexes() in a single ALTER TABLE.
+        
+        Args:
+            table: Table name
+            clauses: ADD INDEX clauses returned by drop_secondary_indexes()
+        """
+        if not self.conn:
+            raise RuntimeError("Not connected to database")
+        if not clauses:
+            return
+        
+        cursor = self._cursor
+        cursor.execute(f"ALTER TABLE `{table}` {', '.join(clauses)}")
+        logger.info(f"  Rebuilt {len(clauses)} secondary indexes on {table}")
     
     def drop_table(self, table: str):
         """
@@ -544,16 +1448,17 @@ class PasarguardLoader:
             raise RuntimeError("Not connected to database")
         
         try:
-            with self.conn.cursor() as cursor:
-                cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+            cursor = self._cursor
+            cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
             self.conn.commit()
+            self._invalidate_schema()
             logger.info(f"Dropped table: {table}")
         except Exception as e:
             self.conn.rollback()
             logger.error(f"Failed to drop table {table}: {e}")
             raise
     
-    def cleanup_extra_tables(self, valid_tables: set):
+    def cleanup_extra_tables(self, valid_tables: FrozenSet[str]):
         """
         Drop all tables that are not in the valid tables list.
         
@@ -582,25 +1487,35 @@ class PasarguardLoader:
             logger.warning(f"  - {table}")
         
         # Disable foreign key checks to allow dropping tables with dependencies
-        with self.conn.cursor() as cursor:
-            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        cursor = self._cursor
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
         
         try:
-            # Drop each extra table
-            dropped_count = 0
-            for table in tables_to_drop:
-                try:
-                    self.drop_table(table)
-                    dropped_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to drop {table}: {e}")
+            # Drop all extra tables with a single statement
+            try:
+                cursor = self._cursor
+                cursor.execute(
+                    "DROP TABLE IF EXISTS " + ", ".join(f"`{table}`" for table in tables_to_drop)
+                )
+                dropped_count = len(tables_to_drop)
+            except db.MySQLError as e:
+                # Fall back to dropping each table so one failure doesn't keep the rest
+                logger.warning(f"Could not drop extra tables in one statement ({e}), dropping them one by one")
+                dropped_count = 0
+                for table in tables_to_drop:
+                    try:
+                        self.drop_table(table)
+                        dropped_count += 1
+                    except Exception as e:
+                        logger.error(f"Failed to drop {table}: {e}")
+            self._invalidate_schema()
             
             logger.info(f"✓ Dropped {dropped_count}/{len(tables_to_drop)} extra tables")
             
         finally:
-            # Re-enable foreign key checks
-            with self.conn.cursor() as cursor:
-                cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+            # Re-enable foreign key checks (unless the bulk session keeps them off)
+            cursor = self._cursor
+            cursor.execute(f"SET FOREIGN_KEY_CHECKS = {self._session_value('foreign_key_checks')}")
     
     def insert_default_settings(self):
         """
@@ -614,52 +1529,50 @@ class PasarguardLoader:
             # Check if settings table exists, create if not
             if not self.table_exists('settings'):
                 logger.info("Settings table doesn't exist, creating it...")
-                with self.conn.cursor() as cursor:
-                    cursor.execute("""
-                        CREATE TABLE `settings` (
-                            `id` INT NOT NULL AUTO_INCREMENT,
-                            `telegram` JSON NOT NULL,
-                            `discord` JSON NOT NULL,
-                            `webhook` JSON NOT NULL,
-                            `notification_settings` JSON NOT NULL,
-                            `notification_enable` JSON NOT NULL,
-                            `subscription` JSON NOT NULL,
-                            `general` JSON NOT NULL,
-                            PRIMARY KEY (`id`)
-                        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                    """)
+                cursor = self._cursor
+                cursor.execute("""
+                    CREATE TABLE `settings` (
+                        `id` INT NOT NULL AUTO_INCREMENT,
+                        `telegram` JSON NOT NULL,
+                        `discord` JSON NOT NULL,
+                        `webhook` JSON NOT NULL,
+                        `notification_settings` JSON NOT NULL,
+                        `notification_enable` JSON NOT NULL,
+                        `subscription` JSON NOT NULL,
+                        `general` JSON NOT NULL,
+                        PRIMARY KEY (`id`)
+                    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+                """)
                 self.conn.commit()
+                self._invalidate_schema()
                 logger.info("✓ Created settings table")
             
-            with self.conn.cursor() as cursor:
-                # Check if settings row already exists
-                cursor.execute("SELECT COUNT(*) as count FROM settings")
-                result = cursor.fetchone()
-                
-                if result['count'] > 0:
-                    logger.info(f"Settings table already has {result['count']} row(s), skipping default insertion")
-                    return
-                
-                # Insert default settings
-                default_settings = {
-                    'telegram': '{"enable": false, "token": null, "webhook_url": null, "webhook_secret": null, "proxy_url": null, "method": "webhook", "mini_app_login": true, "mini_app_web_url": "", "for_admins_only": true}',
-                    'discord': '{"enable": false, "token": null, "proxy_url": null}',
-                    'webhook': '{"enable": false, "webhooks": [], "days_left": [], "usage_percent": [], "timeout": 10, "recurrent": 1, "proxy_url": null}',
-                    'notification_settings': '{"notify_telegram": false, "notify_discord": false, "telegram_api_token": null, "telegram_admin_id": null, "telegram_channel_id": null, "telegram_topic_id": null, "discord_webhook_url": null, "proxy_url": null, "max_retries": 3}',
-                    'notification_enable': '{"admin": {"create": true, "modify": true, "delete": true, "reset_usage": true, "login": true}, "core": {"create": true, "modify": true, "delete": true}, "group": {"create": true, "modify": true, "delete": true}, "host": {"create": true, "modify": true, "delete": true, "modify_hosts": true}, "node": {"create": true, "modify": true, "delete": true, "connect": true, "error": true}, "user": {"create": true, "modify": true, "delete": true, "status_change": true, "reset_data_usage": true, "data_reset_by_next": true, "subscription_revoked": true}, "user_template": {"create": true, "modify": true, "delete": true}, "days_left": true, "percentage_reached": true}',
-                    'subscription': '{"url_prefix": "", "update_interval": 12, "support_url": "https://t.me/", "profile_title": "Subscription", "host_status_filter": true, "rules": [], "manual_sub_request": {"links": true, "links_base64": true, "xray": true, "sing_box": true, "clash": true, "clash_meta": true, "outline": true}, "applications": []}',
-                    'general': '{"default_flow": "", "default_method": "chacha20-ietf-poly1305"}'
-                }
-                
-                cursor.execute(
-                    """
-                    INSERT INTO settings 
-                    (telegram, discord, webhook, notification_settings, notification_enable, subscription, `general`)
-                    VALUES (%(telegram)s, %(discord)s, %(webhook)s, %(notification_settings)s, 
-                            %(notification_enable)s, %(subscription)s, %(general)s)
-                    """,
-                    default_settings
-                )
+            cursor = self._cursor
+            # Check if settings row already exists
+            cursor.execute("SELECT COUNT(*) as count FROM settings")
+            result = cursor.fetchone()
+            
+            if result['count'] > 0:
+                logger.info(f"Settings table already has {result['count']} row(s), skipping default insertion")
+                return
+            
+            # Insert default settings
+            default_settings = {
+                'telegram': '{"enable": false, "token": null, "webhook_url": null, "webhook_secret": null, "proxy_url": null, "method": "webhook", "mini_app_login": true, "mini_app_web_url": "", "for_admins_only": true}',
+                'discord': '{"enable": false, "token": null, "proxy_url": null}',
+                'webhook': '{"enable": false, "webhooks": [], "days_left": [], "usage_percent": [], "timeout": 10, "recurrent": 1, "proxy_url": null}',
+                'notification_settings': '{"notify_telegram": false, "notify_discord": false, "telegram_api_token": null, "telegram_admin_id": null, "telegram_channel_id": null, "telegram_topic_id": null, "discord_webhook_url": null, "proxy_url": null, "max_retries": 3}',
+                'notification_enable': '{"admin": {"create": true, "modify": true, "delete": true, "reset_usage": true, "login": true}, "core": {"create": true, "modify": true, "delete": true}, "group": {"create": true, "modify": true, "delete": true}, "host": {"create": true, "modify": true, "delete": true, "modify_hosts": true}, "node": {"create": true, "modify": true, "delete": true, "connect": true, "error": true}, "user": {"create": true, "modify": true, "delete": true, "status_change": true, "reset_data_usage": true, "data_reset_by_next": true, "subscription_revoked": true}, "user_template": {"create": true, "modify": true, "delete": true}, "days_left": true, "percentage_reached": true}',
+                'subscription': '{"url_prefix": "", "update_interval": 12, "support_url": "https://t.me/", "profile_title": "Subscription", "host_status_filter": true, "rules": [], "manual_sub_request": {"links": true, "links_base64": true, "xray": true, "sing_box": true, "clash": true, "clash_meta": true, "outline": true}, "applications": []}',
+                'general': '{"default_flow": "", "default_method": "chacha20-ietf-poly1305"}'
+            }
+            
+            # Positional %s parameters in column order, like every INSERT built by this loader
+            columns = tuple(default_settings)
+            cursor.execute(
+                self._build_insert_query('settings', columns),
+                tuple(default_settings[col] for col in columns)
+            )
             
             self.conn.commit()
             logger.info("✓ Inserted default settings row")
@@ -681,249 +1594,244 @@ class PasarguardLoader:
                 logger.info("Settings table doesn't exist, skipping default_flow fix")
                 return
             
-            with self.conn.cursor() as cursor:
-                # Check if any settings have invalid default_flow
-                cursor.execute("SELECT id, general FROM settings")
-                rows = cursor.fetchall()
-                
-                if not rows:
-                    logger.info("No settings found, skipping default_flow fix")
-                    return
-                
-                import json
-                fixed_count = 0
+            cursor = self._cursor
+            # Check if any settings have invalid default_flow
+            cursor.execute("SELECT id, general FROM settings")
+            rows = cursor.fetchall()
+            
+            if not rows:
+                logger.info("No settings found, skipping default_flow fix")
+                return
+            
+            fixed_count = 0
+            
+            for row in rows:
+                general = row['general']
+                if isinstance(general, str):
+                    general = json.loads(general)
                 
-                for row in rows:
-                    general = row['general']
-                    if isinstance(general, str):
-                        general = json.loads(general)
+                # Check if default_flow is 'none' (invalid)
+                if general.get('default_flow') == 'none':
+                    logger.info(f"Fixing invalid default_flow in settings row {row['id']}...")
+                    general['default_flow'] = ''  # Change to empty string
                     
-                    # Check if default_flow is 'none' (invalid)
-                    if general.get('default_flow') == 'none':
-                        logger.info(f"Fixing invalid default_flow in settings row {row['id']}...")
-                        general['default_flow'] = ''  # Change to empty string
-                        
-                        # Update the row
-                        cursor.execute(
-                            "UPDATE settings SET general = %s WHERE id = %s",
-                            (json.dumps(general), row['id'])
-                        )
-                        fixed_count += 1
-                        logger.info(f"✓ Fixed default_flow in settings row {row['id']}")
+                    # Update the row
+                    cursor.execute(
+                        "UPDATE settings SET general = %s WHERE id = %s",
+                        (json_dumps(general), row['id'])
+                    )
+                    fixed_count += 1
+                    logger.info(f"✓ Fixed default_flow in settings row {row['id']}")
+            
+            if fixed_count > 0:
+                self.conn.commit()
+                logger.info(f"✓ Fixed default_flow in {fixed_count} settings row(s)")
+            else:
+                logger.info("Settings default_flow values are already correct")
                 
-                if fixed_count > 0:
-                    self.conn.commit()
-                    logger.info(f"✓ Fixed default_flow in {fixed_count} settings row(s)")
-                else:
-                    logger.info("Settings default_flow values are already correct")
-                    
         except Exception as e:
             self.conn.rollback()
             logger.error(f"Failed to fix settings default_flow: {e}")
             raise
     
-    def add_missing_node_columns(self):
+    def _alter_table(self, table: str, clauses: List[str]):
         """
-        Add missing columns to nodes table that exist in PasarGuard but not in Marzneshin.
-        This is needed because we're setting the Alembic version without running all migrations.
+        Apply a list of ALTER clauses to a table in one ALTER TABLE statement.
+        
+        MySQL handles every clause of a single ALTER in one copy/in-place pass,
+        instead of rebuilding and locking the table once per column. The statement
+        is tried with each of ALTER_ALGORITHMS before the server default, so nullable ADD COLUMNs
+        run as INSTANT metadata changes where the server supports it and renames
+        or foreign keys fall back to INPLACE or the server's default.
+        
+        Args:
+            table: Table name
+            clauses: ALTER clauses (e.g. "ADD COLUMN `x` INT NULL")
+        """
+        if not clauses:
+            return
+        cursor = self._cursor
+        alter = f"ALTER TABLE `{table}` {', '.join(clauses)}"
+        for algorithm in ALTER_ALGORITHMS:
+            try:
+                cursor.execute(f"{alter}, {algorithm}")
+                return
+            except db.MySQLError as e:
+                if not e.args or e.args[0] not in ALTER_ALGORITHM_UNSUPPORTED_ERRORS:
+                    raise
+                logger.debug(f"{table}: {algorithm} not supported ({e}), retrying")
+        cursor.execute(alter)
+    
+    def _update_where(self, table: str, assignment: str, condition: str, params: tuple = ()) -> int:
+        """
+        Run an UPDATE only if at least one row matches its condition.
+        
+        The fixup UPDATEs are usually no-ops on re-runs; a LIMIT 1 probe stops at
+        the first matching row (or reads the table once) instead of taking the
+        write path and its row locks over the whole table.
+        
+        Args:
+            table: Table name
+            assignment: SET clause (e.g. "path = '/'")
+            condition: WHERE clause
+            params: Parameters for %s placeholders in the condition
+            
+        Returns:
+            Number of rows updated
+        """
+        cursor = self._cursor
+        args = params or None
+        cursor.execute(f"SELECT 1 FROM `{table}` WHERE {condition} LIMIT 1", args)
+        if cursor.fetchone() is None:
+            return 0
+        cursor.execute(f"UPDATE `{table}` SET {assignment} WHERE {condition}", args)
+        return cursor.rowcount
+    
+    def add_all_missing_columns(self, max_workers: int = 5):
+        """
+        Run the add_missing_*_columns fixups concurrently, one connection per table.
+        
+        The fixups alter disjoint tables and commit on their own, so the server can
+        run their ALTERs side by side. Every fixup runs to completion before the
+        first failure (if any) is raised.
+        
+        Args:
+            max_workers: Maximum number of tables altered at once
+        """
+        if not self.conn:
+            raise RuntimeError("Not connected to database")
+        
+        fixups = [
+            PasarguardLoader.add_missing_admin_columns,
+            PasarguardLoader.add_missing_user_columns,
+            PasarguardLoader.add_missing_user_template_columns,
+            PasarguardLoader.add_missing_node_columns,
+            PasarguardLoader.add_missing_host_columns,
+        ]
+        workers = min(max(1, max_workers), len(fixups))
+        if workers <= 1:
+            for fixup in fixups:
+                fixup(self)
+            return
+        
+        schema = self.get_schema()
+        # End this connection's snapshot so it holds no metadata locks on the tables being altered
+        self.conn.commit()
+        self._grow_pool(workers)
+        
+        def apply(fixup: Callable[[PasarguardLoader], None]):
+            loader = self._pool.get()
+            try:
+                # Fixups run with normal foreign key and unique checks
+                loader.end_bulk_session()
+                # Share the schema cache; each fixup only updates its own table
+                loader.share_schema(schema)
+                fixup(loader)
+            finally:
+                loader._invalidate_schema()
+                self._pool.put(loader)
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fixup') as executor:
+            futures = [executor.submit(apply, fixup) for fixup in fixups]
+        
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            self._invalidate_schema()
+            raise errors[0]
+    
+    def _apply_column_specs(self, table: str, specs: Tuple[ColumnSpec, ...]):
+        """
+        Bring a table's columns in line with their specs in one ALTER TABLE.
+        
+        Missing columns are added (or renamed from rename_from), existing columns
+        failing their matches check are modified, and the cleanup UPDATEs run once
+        the definitions are in place.
+        
+        Args:
+            table: Table name
+            specs: Expected columns of the table
         """
         if not self.conn:
             raise RuntimeError("Not connected to database")
         
         try:
-            if not self.table_exists('nodes'):
-                logger.info("Nodes table doesn't exist, skipping missing columns")
+            columns = self.get_schema().get(table)
+            if columns is None:
+                logger.info(f"{table} table doesn't exist, skipping missing columns")
                 return
             
-            with self.conn.cursor() as cursor:
-                # Check which columns exist
-                cursor.execute("DESCRIBE nodes")
-                existing_columns = {row['Field'] for row in cursor.fetchall()}
-                
-                columns_added = []
+            clauses = []
+            changes = []
+            cleanups = []
+            for spec in specs:
+                column = columns.get(spec.name)
+                # A column added here already holds its DEFAULT in every row and needs no cleanup
+                if column is not None and spec.cleanup:
+                    cleanups.append(spec.cleanup)
                 
-                # Add api_key column if missing
-                if 'api_key' not in existing_columns:
-                    logger.info("Adding missing 'api_key' column to nodes table...")
-                    cursor.execute("""
-                        ALTER TABLE nodes 
-                        ADD COLUMN `api_key` VARCHAR(36) NULL
-                    """)
-                    columns_added.append('api_key')
-                    logger.info("✓ Added api_key column to nodes table")
-                
-                # Add core_config_id column if missing
-                if 'core_config_id' not in existing_columns:
-                    logger.info("Adding missing 'core_config_id' column to nodes table...")
-                    # First check if core_configs table exists
-                    if self.table_exists('core_configs'):
-                        cursor.execute("""
-                            ALTER TABLE nodes 
-                            ADD COLUMN `core_config_id` INT NULL,
-                            ADD CONSTRAINT `fk_nodes_core_config_id` 
-                            FOREIGN KEY (`core_config_id`) 
-                            REFERENCES `core_configs`(`id`) 
-                            ON DELETE SET NULL
-                        """)
+                if column is None:
+                    if spec.rename_from in columns:
+                        clauses.append(spec.rename_clause)
+                        changes.append(f"{spec.name} (renamed from {spec.rename_from})")
                     else:
-                        # Add without foreign key constraint if core_configs doesn't exist
-                        cursor.execute("""
-                            ALTER TABLE nodes 
-                            ADD COLUMN `core_config_id` INT NULL
-                        """)
-                    columns_added.append('core_config_id')
-                    logger.info("✓ Added core_config_id column to nodes table")
-                
-                # Add max_logs column if missing
-                if 'max_logs' not in existing_columns:
-                    logger.info("Adding missing 'max_logs' column to nodes table...")
-                    cursor.execute("""
-                        ALTER TABLE nodes 
-                        ADD COLUMN `max_logs` BIGINT NOT NULL DEFAULT 1000
-                    """)
-                    columns_added.append('max_logs')
-                    logger.info("✓ Added max_logs column to nodes table")
-                
-                # Add gather_logs column if missing
-                if 'gather_logs' not in existing_columns:
-                    logger.info("Adding missing 'gather_logs' column to nodes table...")
-                    cursor.execute("""
-                        ALTER TABLE nodes 
-                        ADD COLUMN `gather_logs` TINYINT(1) NOT NULL DEFAULT 1
-                    """)
-                    columns_added.append('gather_logs')
-                    logger.info("✓ Added gather_logs column to nodes table")
-                
-                # Log summary
-                if columns_added:
-                    logger.info(f"✓ Applied missing schema changes to nodes table: {', '.join(columns_added)}")
+                        clauses.append(spec.add_clause)
+                        # Only add the foreign key if the referenced table exists
+                        if spec.references and self.table_exists(spec.references[0]):
+                            ref_table, ref_column = spec.references
+                            clauses.append(
+                                f"ADD CONSTRAINT `fk_{table}_{spec.name}` "
+                                f"FOREIGN KEY (`{spec.name}`) "
+                                f"REFERENCES `{ref_table}`(`{ref_column}`) "
+                                f"ON DELETE SET NULL"
+                            )
+                        changes.append(spec.name)
+                elif spec.matches and not spec.matches(column):
+                    if spec.backfill:
+                        filled = self._update_where(table, *spec.backfill)
+                        if filled > 0:
+                            logger.info(f"✓ Updated {filled} {spec.name} values before fixing the column")
+                    clauses.append(spec.modify_clause)
+                    changes.append(f"{spec.name} (type fixed)")
                 else:
-                    logger.info("Nodes table schema is up to date")
+                    continue
+                # The except block drops the cached schema again if the ALTER fails
+                self._cache_column(
+                    table, spec.name, spec.column_type, spec.nullable, spec.default,
+                    old_name=spec.rename_from
+                )
+            
+            self._alter_table(table, clauses)
+            
+            for assignment, condition in cleanups:
+                self._update_where(table, assignment, condition)
+            
+            # One summary line per table covers every added, renamed and fixed column
+            if changes:
+                logger.info(f"✓ Applied missing schema changes to {table} table: {', '.join(changes)}")
+            else:
+                logger.info(f"{table} table schema is up to date")
             
             self.conn.commit()
-                
+        
         except Exception as e:
             self.conn.rollback()
-            logger.error(f"Failed to add missing node columns: {e}")
+            self._invalidate_schema()
+            logger.error(f"Failed to add missing {table} columns: {e}")
             raise
     
+    def add_missing_node_columns(self):
+        """
+        Add missing columns to nodes table that exist in PasarGuard but not in Marzneshin.
+        This is needed because we're setting the Alembic version without running all migrations.
+        """
+        self._apply_column_specs('nodes', MISSING_COLUMNS['nodes'])
+    
     def add_missing_host_columns(self):
         """
         Add missing columns to hosts table that are expected by the latest PasarGuard version.
         This is needed because we're setting the Alembic version without running all migrations.
         """
-        if not self.conn:
-            raise RuntimeError("Not connected to database")
-        
-        try:
-            if not self.table_exists('hosts'):
-                logger.info("Hosts table doesn't exist, skipping missing columns")
-                return
-            
-            with self.conn.cursor() as cursor:
-                # Check which columns exist (with metadata to validate types)
-                cursor.execute("DESCRIBE hosts")
-                column_details = cursor.fetchall()
-                existing_columns = {row['Field'] for row in column_details}
-                column_info = {row['Field']: row for row in column_details}
-                
-                schema_changes = []
-                
-                def _is_enum_like(col_type: str) -> bool:
-                    lowered = col_type.lower()
-                    return lowered.startswith("enum(") or lowered.startswith("set(")
-                
-                # Add status column if missing
-                if 'status' not in existing_columns:
-                    logger.info("Adding missing 'status' column to hosts table...")
-                    # Add as nullable first, update rows, then make non-nullable
-                    cursor.execute("""
-                        ALTER TABLE hosts 
-                        ADD COLUMN `status` VARCHAR(60) NULL DEFAULT ''
-                    """)
-                    cursor.execute("UPDATE hosts SET status = '' WHERE status IS NULL")
-                    schema_changes.append("status (added)")
-                    logger.info("✓ Added status column to hosts table")
-                    column_info['status'] = {'Type': 'varchar(60)', 'Null': 'YES', 'Default': ''}
-                else:
-                    status_col = column_info['status']
-                    status_type = status_col['Type'].lower()
-                    status_null = status_col['Null'] == 'YES'
-                    status_default = status_col['Default']
-                    needs_status_fix = (
-                        _is_enum_like(status_type)
-                        or not status_type.startswith('varchar(60)')
-                        or not status_null
-                        or status_default not in ('', None)
-                    )
-                    if needs_status_fix:
-                        logger.info("Fixing 'status' column definition on hosts table...")
-                        cursor.execute("""
-                            ALTER TABLE hosts 
-                            MODIFY COLUMN `status` VARCHAR(60) NULL DEFAULT ''
-                        """)
-                        schema_changes.append("status (type fixed)")
-                    # Clean up legacy empty array values
-                    cursor.execute("""
-                        UPDATE hosts 
-                        SET status = '' 
-                        WHERE status IS NULL OR status IN ('[]', '{}')
-                    """)
-                
-                # Add ech_config_list column if missing  
-                if 'ech_config_list' not in existing_columns:
-                    logger.info("Adding missing 'ech_config_list' column to hosts table...")
-                    cursor.execute("""
-                        ALTER TABLE hosts 
-                        ADD COLUMN `ech_config_list` VARCHAR(512) DEFAULT NULL
-                    """)
-                    schema_changes.append('ech_config_list')
-                    logger.info("✓ Added ech_config_list column to hosts table")
-                
-                # Ensure ALPN column matches PasarGuard expectations
-                if 'alpn' not in existing_columns:
-                    logger.info("Adding missing 'alpn' column to hosts table...")
-                    cursor.execute("""
-                        ALTER TABLE hosts 
-                        ADD COLUMN `alpn` VARCHAR(14) NULL DEFAULT NULL
-                    """)
-                    schema_changes.append("alpn (added)")
-                else:
-                    alpn_col = column_info['alpn']
-                    alpn_type = alpn_col['Type'].lower()
-                    alpn_null = alpn_col['Null'] == 'YES'
-                    alpn_default = alpn_col['Default']
-                    needs_alpn_fix = (
-                        _is_enum_like(alpn_type)
-                        or not alpn_type.startswith('varchar(14)')
-                        or not alpn_null
-                        or alpn_default is not None
-                    )
-                    if needs_alpn_fix:
-                        logger.info("Fixing 'alpn' column definition on hosts table...")
-                        cursor.execute("""
-                            ALTER TABLE hosts 
-                            MODIFY COLUMN `alpn` VARCHAR(14) NULL DEFAULT NULL
-                        """)
-                        schema_changes.append("alpn (type fixed)")
-                    cursor.execute("""
-                        UPDATE hosts 
-                        SET alpn = NULL 
-                        WHERE alpn IN ('none', '', '[]')
-                    """)
-                
-                # Log summary
-                if schema_changes:
-                    logger.info(f"✓ Applied hosts schema changes: {', '.join(schema_changes)}")
-                else:
-                    logger.info("Hosts table schema is up to date")
-            
-            self.conn.commit()
-                
-        except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Failed to add missing host columns: {e}")
-            raise
+        self._apply_column_specs('hosts', MISSING_COLUMNS['hosts'])
     
     def fix_hosts_null_paths(self):
         """
@@ -939,15 +1847,13 @@ class PasarguardLoader:
                 logger.info("Hosts table doesn't exist, skipping path fix")
                 return
             
-            with self.conn.cursor() as cursor:
-                # Update NULL paths to '/' (Pasarguard may convert empty strings to None)
-                cursor.execute("UPDATE hosts SET path = '/' WHERE path IS NULL OR path = ''")
-                rows_updated = cursor.rowcount
-                
-                if rows_updated > 0:
-                    logger.info(f"✓ Fixed {rows_updated} hosts with NULL or empty path values (set to '/')")
-                else:
-                    logger.info("No hosts with NULL or empty path values found")
+            # Update NULL paths to '/' (Pasarguard may convert empty strings to None)
+            rows_updated = self._update_where('hosts', "path = '/'", "path IS NULL OR path = ''")
+            
+            if rows_updated > 0:
+                logger.info(f"✓ Fixed {rows_updated} hosts with NULL or empty path values (set to '/')")
+            else:
+                logger.info("No hosts with NULL or empty path values found")
             
             self.conn.commit()
                 
@@ -961,314 +1867,18 @@ class PasarguardLoader:
         Add missing columns to users table that are expected by the latest PasarGuard version.
         This is needed because we're setting the Alembic version without running all migrations.
         """
-        if not self.conn:
-            raise RuntimeError("Not connected to database")
-        
-        try:
-            if not self.table_exists('users'):
-                logger.info("Users table doesn't exist, skipping missing columns")
-                return
-            
-            with self.conn.cursor() as cursor:
-                # Check which columns exist
-                cursor.execute("DESCRIBE users")
-                existing_columns = {row['Field'] for row in cursor.fetchall()}
-                
-                columns_added = []
-                
-                # Add proxy_settings column if missing
-                if 'proxy_settings' not in existing_columns:
-                    logger.info("Adding missing 'proxy_settings' column to users table...")
-                    cursor.execute("""
-                        ALTER TABLE users 
-                        ADD COLUMN `proxy_settings` JSON NOT NULL DEFAULT ('{}')
-                    """)
-                    columns_added.append('proxy_settings')
-                    logger.info("✓ Added proxy_settings column to users table")
-                
-                # Log summary
-                if columns_added:
-                    logger.info(f"✓ Applied missing schema changes to users table: {', '.join(columns_added)}")
-                else:
-                    logger.info("Users table schema is up to date")
-            
-            self.conn.commit()
-                
-        except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Failed to add missing user columns: {e}")
-            raise
+        self._apply_column_specs('users', MISSING_COLUMNS['users'])
     
     def add_missing_admin_columns(self):
         """
         Add missing columns to admins table that are expected by the latest PasarGuard version.
         This is needed because we're setting the Alembic version without running all migrations.
         """
-        if not self.conn:
-            raise RuntimeError("Not connected to database")
-        
-        try:
-            if not self.table_exists('admins'):
-                logger.info("Admins table doesn't exist, skipping missing columns")
-                return
-            
-            with self.conn.cursor() as cursor:
-                # Check which columns exist
-                cursor.execute("DESCRIBE admins")
-                existing_columns = {row['Field'] for row in cursor.fetchall()}
-                
-                columns_added = []
-                
-                # Add discord_id column if missing
-                if 'discord_id' not in existing_columns:
-                    logger.info("Adding missing 'discord_id' column to admins table...")
-                    cursor.execute("""
-                        ALTER TABLE admins 
-                        ADD COLUMN `discord_id` BIGINT DEFAULT NULL
-                    """)
-                    columns_added.append('discord_id')
-                    logger.info("✓ Added discord_id column to admins table")
-                
-                # Add discord_webhook column if missing
-                if 'discord_webhook' not in existing_columns:
-                    logger.info("Adding missing 'discord_webhook' column to admins table...")
-                    cursor.execute("""
-                        ALTER TABLE admins 
-                        ADD COLUMN `discord_webhook` VARCHAR(1024) DEFAULT NULL
-                    """)
-                    columns_added.append('discord_webhook')
-                    logger.info("✓ Added discord_webhook column to admins table")
-                
-                # Add sub_template column if missing
-                if 'sub_template' not in existing_columns:
-                    logger.info("Adding missing 'sub_template' column to admins table...")
-                    cursor.execute("""
-                        ALTER TABLE admins 
-                        ADD COLUMN `sub_template` VARCHAR(1024) DEFAULT NULL
-                    """)
-                    columns_added.append('sub_template')
-                    logger.info("✓ Added sub_template column to admins table")
-                
-                # Add sub_domain column if missing
-                if 'sub_domain' not in existing_columns:
-                    logger.info("Adding missing 'sub_domain' column to admins table...")
-                    cursor.execute("""
-                        ALTER TABLE admins 
-                        ADD COLUMN `sub_domain` VARCHAR(256) DEFAULT NULL
-                    """)
-                    columns_added.append('sub_domain')
-                    logger.info("✓ Added sub_domain column to admins table")
-                
-                # Add profile_title column if missing
-                if 'profile_title' not in existing_columns:
-                    logger.info("Adding missing 'profile_title' column to admins table...")
-                    cursor.execute("""
-                        ALTER TABLE admins 
-                        ADD COLUMN `profile_title` VARCHAR(512) DEFAULT NULL
-                    """)
-                    columns_added.append('profile_title')
-                    logger.info("✓ Added profile_title column to admins table")
-                
-                # Add support_url column if missing
-                if 'support_url' not in existing_columns:
-                    logger.info("Adding missing 'support_url' column to admins table...")
-                    cursor.execute("""
-                        ALTER TABLE admins 
-                        ADD COLUMN `support_url` VARCHAR(1024) DEFAULT NULL
-                    """)
-                    columns_added.append('support_url')
-                    logger.info("✓ Added support_url column to admins table")
-                
-                # Handle used_traffic column (might be named users_usage in older versions)
-                if 'used_traffic' not in existing_columns:
-                    if 'users_usage' in existing_columns:
-                        # Rename users_usage to used_traffic
-                        logger.info("Renaming 'users_usage' to 'used_traffic' in admins table...")
-                        cursor.execute("""
-                            ALTER TABLE admins 
-                            CHANGE COLUMN `users_usage` `used_traffic` BIGINT NOT NULL DEFAULT 0
-                        """)
-                        columns_added.append('used_traffic (renamed from users_usage)')
-                        logger.info("✓ Renamed users_usage to used_traffic in admins table")
-                    else:
-                        # Add used_traffic column
-                        logger.info("Adding missing 'used_traffic' column to admins table...")
-                        cursor.execute("""
-                            ALTER TABLE admins 
-                            ADD COLUMN `used_traffic` BIGINT NOT NULL DEFAULT 0
-                        """)
-                        columns_added.append('used_traffic')
-                        logger.info("✓ Added used_traffic column to admins table")
-                
-                # Add is_disabled column if missing
-                if 'is_disabled' not in existing_columns:
-                    logger.info("Adding missing 'is_disabled' column to admins table...")
-                    cursor.execute("""
-                        ALTER TABLE admins 
-                        ADD COLUMN `is_disabled` TINYINT(1) NOT NULL DEFAULT 0
-                    """)
-                    columns_added.append('is_disabled')
-                    logger.info("✓ Added is_disabled column to admins table")
-                
-                # Add notification_enable column if missing, or fix if it's nullable
-                default_notification_enable = json.dumps({
-                    "create": False,
-                    "modify": False,
-                    "delete": False,
-                    "status_change": False,
-                    "reset_data_usage": False,
-                    "data_reset_by_next": False,
-                    "subscription_revoked": False
-                })
-                # Escape the JSON string for use in SQL (escape single quotes by doubling them for MySQL)
-                # Then wrap in CAST(... AS JSON) for proper JSON default value
-                escaped_default = default_notification_enable.replace("'", "''")
-                json_default = f"CAST('{escaped_default}' AS JSON)"
-                
-                if 'notification_enable' not in existing_columns:
-                    logger.info("Adding missing 'notification_enable' column to admins table...")
-                    cursor.execute(f"""
-                        ALTER TABLE admins 
-                        ADD COLUMN `notification_enable` JSON NOT NULL DEFAULT {json_default}
-                    """)
-                    columns_added.append('notification_enable')
-                    logger.info("✓ Added notification_enable column to admins table")
-                else:
-                    # Check if column is nullable or has wrong default
-                    cursor.execute("""
-                        SELECT IS_NULLABLE, COLUMN_DEFAULT
-                        FROM INFORMATION_SCHEMA.COLUMNS
-                        WHERE TABLE_SCHEMA = DATABASE()
-                        AND TABLE_NAME = 'admins'
-                        AND COLUMN_NAME = 'notification_enable'
-                    """)
-                    col_info = cursor.fetchone()
-                    
-                    if col_info and (col_info['IS_NULLABLE'] == 'YES' or col_info['COLUMN_DEFAULT'] is None):
-                        logger.info("Fixing 'notification_enable' column to be NOT NULL with default value...")
-                        # First, update any NULL values to the default
-                        cursor.execute("""
-                            UPDATE admins 
-                            SET notification_enable = %s 
-                            WHERE notification_enable IS NULL
-                        """, (default_notification_enable,))
-                        null_count = cursor.rowcount
-                        if null_count > 0:
-                            logger.info(f"✓ Updated {null_count} NULL notification_enable values to default")
-                        
-                        # Then modify the column to be NOT NULL with default
-                        cursor.execute(f"""
-                            ALTER TABLE admins 
-                            MODIFY COLUMN `notification_enable` JSON NOT NULL DEFAULT {json_default}
-                        """)
-                        columns_added.append('notification_enable (fixed)')
-                        logger.info("✓ Fixed notification_enable column to be NOT NULL with default")
-                    else:
-                        logger.info("notification_enable column already exists with correct constraints, skipping")
-                
-                # Log summary
-                if columns_added:
-                    logger.info(f"✓ Applied missing schema changes to admins table: {', '.join(columns_added)}")
-                else:
-                    logger.info("Admins table schema is up to date")
-            
-            self.conn.commit()
-                
-        except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Failed to add missing admin columns: {e}")
-            raise
+        self._apply_column_specs('admins', MISSING_COLUMNS['admins'])
     
     def add_missing_user_template_columns(self):
         """
         Add missing columns to user_templates table that are expected by the latest PasarGuard version.
         This is needed because we're setting the Alembic version without running all migrations.
         """
-        if not self.conn:
-            raise RuntimeError("Not connected to database")
-        
-        try:
-            if not self.table_exists('user_templates'):
-                logger.info("User templates table doesn't exist, skipping missing columns")
-                return
-            
-            with self.conn.cursor() as cursor:
-                # Check which columns exist
-                cursor.execute("DESCRIBE user_templates")
-                existing_columns = {row['Field'] for row in cursor.fetchall()}
-                
-                columns_added = []
-                
-                # Add extra_settings column if missing
-                if 'extra_settings' not in existing_columns:
-                    logger.info("Adding missing 'extra_settings' column to user_templates table...")
-                    cursor.execute("""
-                        ALTER TABLE user_templates 
-                        ADD COLUMN `extra_settings` JSON DEFAULT NULL
-                    """)
-                    columns_added.append('extra_settings')
-                    logger.info("✓ Added extra_settings column to user_templates table")
-                
-                # Add on_hold_timeout column if missing
-                if 'on_hold_timeout' not in existing_columns:
-                    logger.info("Adding missing 'on_hold_timeout' column to user_templates table...")
-                    cursor.execute("""
-                        ALTER TABLE user_templates 
-                        ADD COLUMN `on_hold_timeout` INT DEFAULT NULL
-                    """)
-                    columns_added.append('on_hold_timeout')
-                    logger.info("✓ Added on_hold_timeout column to user_templates table")
-                
-                # Add status column if missing
-                if 'status' not in existing_columns:
-                    logger.info("Adding missing 'status' column to user_templates table...")
-                    cursor.execute("""
-                        ALTER TABLE user_templates 
-                        ADD COLUMN `status` ENUM('active', 'on_hold') NOT NULL DEFAULT 'active'
-                    """)
-                    columns_added.append('status')
-                    logger.info("✓ Added status column to user_templates table")
-                
-                # Add reset_usages column if missing
-                if 'reset_usages' not in existing_columns:
-                    logger.info("Adding missing 'reset_usages' column to user_templates table...")
-                    cursor.execute("""
-                        ALTER TABLE user_templates 
-                        ADD COLUMN `reset_usages` TINYINT(1) NOT NULL DEFAULT 0
-                    """)
-                    columns_added.append('reset_usages')
-                    logger.info("✓ Added reset_usages column to user_templates table")
-                
-                # Add data_limit_reset_strategy column if missing
-                if 'data_limit_reset_strategy' not in existing_columns:
-                    logger.info("Adding missing 'data_limit_reset_strategy' column to user_templates table...")
-                    cursor.execute("""
-                        ALTER TABLE user_templates 
-                        ADD COLUMN `data_limit_reset_strategy` ENUM('no_reset', 'day', 'week', 'month', 'year') 
-                        NOT NULL DEFAULT 'no_reset'
-                    """)
-                    columns_added.append('data_limit_reset_strategy')
-                    logger.info("✓ Added data_limit_reset_strategy column to user_templates table")
-                
-                # Add is_disabled column if missing
-                if 'is_disabled' not in existing_columns:
-                    logger.info("Adding missing 'is_disabled' column to user_templates table...")
-                    cursor.execute("""
-                        ALTER TABLE user_templates 
-                        ADD COLUMN `is_disabled` TINYINT(1) NOT NULL DEFAULT 0
-                    """)
-                    columns_added.append('is_disabled')
-                    logger.info("✓ Added is_disabled column to user_templates table")
-                
-                # Log summary
-                if columns_added:
-                    logger.info(f"✓ Applied missing schema changes to user_templates table: {', '.join(columns_added)}")
-                else:
-                    logger.info("User templates table schema is up to date")
-            
-            self.conn.commit()
-                
-        except Exception as e:
-            self.conn.rollback()
-            logger.error(f"Failed to add missing user_template columns: {e}")
-            raise
+        self._apply_column_specs('user_templates', MISSING_COLUMNS['user_templates'])
@@ -3,27 +3,63 @@ Main migration orchestration script.
 """
 
 import logging
+import threading
 import time
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
 
 from migration.config import (
     MARZNESHIN_CONFIG,
     PASARGUARD_CONFIG,
     MIGRATION_CONFIG,
     TABLE_ORDER,
-    EXCLUDE_TABLES,
+    TABLE_DEPENDENCY_HINTS,
+    USAGE_TABLES,
+    get_table_spec,
     PASARGUARD_TABLES
 )
+from migration import db
 from migration.extractors import MarzneshinExtractor
 from migration.transformers import DataConverter, DataValidator
-from migration.loaders import PasarguardLoader
-from migration.models.schemas import get_pasarguard_schema, get_column_info, table_exists
-from migration.models.mappings import get_target_table
-from migration.utils import setup_logging, confirm_action, print_statistics, format_duration
+from migration.loaders import PasarguardLoader, TargetColumn
+from migration.models.schemas import (
+    get_table_dependencies,
+    sort_table_dependencies,
+    group_tables_by_level
+)
+from migration.models.mappings import get_target_table, SOURCE_FALLBACKS
+from migration.utils import setup_logging, confirm_action, print_statistics, format_duration, chunked, prefetch
 from migration.generate_subscription_url_mapping import generate_subscription_url_mapping
 
 logger = logging.getLogger(__name__)
 
+# Source tables DataConverter reads while converting other tables (its all_data
+# lookups); every other table's rows are released as soon as it is migrated
+LOOKUP_SOURCE_TABLES = frozenset({'inbounds', 'hosts'})
+
+
+@dataclass
+class TableStats:
+    """Outcome of migrating one table."""
+    source_rows: int = 0
+    migrated: int = 0
+    failed: int = 0
+    duration: float = 0.0
+    error: Optional[str] = None  # Set when the table failed to migrate
+
+
+@dataclass
+class MigrationStats:
+    """Statistics of a migration run."""
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+    duration: float = 0.0
+    tables_migrated: int = 0
+    total_rows_migrated: int = 0
+    total_rows_failed: int = 0
+    table_stats: Dict[str, TableStats] = field(default_factory=dict)
+
 
 class MigrationOrchestrator:
     """Main migration orchestrator."""
@@ -35,15 +71,20 @@ class MigrationOrchestrator:
         self.converter = DataConverter()
         self.validator = DataValidator()
         self.source_data: Dict[str, List[Dict[str, Any]]] = {}
-        self.statistics = {
-            'start_time': None,
-            'end_time': None,
-            'duration': 0,
-            'tables_migrated': 0,
-            'total_rows_migrated': 0,
-            'total_rows_failed': 0,
-            'table_stats': {}
-        }
+        self.streamed_tables: List[str] = []
+        self.table_order: List[str] = list(TABLE_ORDER)
+        self.table_levels: List[List[str]] = [[table] for table in TABLE_ORDER]
+        # Worker threads get their own connections; the lock guards shared bookkeeping
+        self._worker_state = threading.local()
+        self._worker_loaders: List[PasarguardLoader] = []
+        self._worker_extractors: List[MarzneshinExtractor] = []
+        self._lock = threading.Lock()
+        # One batch is validated and converted at a time: the converter's and
+        # validator's per-table caches and cross-table state (dedup sets, the
+        # inbound tag map) are only touched under this lock. Batches of tables on
+        # the same level still interleave, so no state may span batches unlocked
+        self._convert_lock = threading.Lock()
+        self.statistics = MigrationStats()
     
     def run(self):
         """
@@ -57,8 +98,9 @@ class MigrationOrchestrator:
         logger.info("=" * 70)
         logger.info("MARZNESHIN TO PASARGUARD MIGRATION")
         logger.info("=" * 70)
+        logger.info(f"MySQL driver: {db.get_driver_name()}")
         
-        self.statistics['start_time'] = time.time()
+        self.statistics.start_time = time.time()
         
         try:
             # Step 1: Extract source data
@@ -76,8 +118,10 @@ class MigrationOrchestrator:
             
             # Step 4: Get target schema
             logger.info("\n[STEP 4] Analyzing target schema...")
-            target_schema = get_pasarguard_schema(self.loader.conn)
+            # Read once by the loader, which then answers table_exists() from the same cache
+            target_schema = self.loader.get_column_infos()
             logger.info(f"Found {len(target_schema)} tables in target database")
+            self._resolve_table_order()
             
             # Step 5: Clear existing data (with confirmation)
             logger.info("\n[STEP 5] Clearing existing data...")
@@ -90,6 +134,8 @@ class MigrationOrchestrator:
             # Step 6: Migrate tables
             logger.info("\n[STEP 6] Migrating tables...")
             self._migrate_tables(target_schema)
+            # Schema fixups below run with normal foreign key and unique checks
+            self.loader.end_bulk_session()
             
             # Step 7: Reset auto-increments
             logger.info("\n[STEP 7] Resetting auto-increment values...")
@@ -118,24 +164,17 @@ class MigrationOrchestrator:
             
             # Step 11: Apply missing schema changes
             logger.info("\n[STEP 11] Applying missing schema changes...")
-            self.loader.add_missing_admin_columns()
-            self.loader.add_missing_user_columns()
-            self.loader.add_missing_user_template_columns()
-            self.loader.add_missing_node_columns()
-            self.loader.add_missing_host_columns()
+            self.loader.add_all_missing_columns()
             self.loader.fix_hosts_null_paths()
             self.loader.fix_settings_default_flow()
             
             # Step 12: Generate subscription URL mapping
             logger.info("\n[STEP 12] Generating subscription URL mapping...")
             try:
-                output_file = getattr(MIGRATION_CONFIG, 'url_mapping_output_file', 'subscription_url_mapping.json')
-                marzneshin_path = getattr(MIGRATION_CONFIG, 'marzneshin_subscription_path', 'sub')
-                pasarguard_path = getattr(MIGRATION_CONFIG, 'pasarguard_subscription_path', 'sub')
                 generate_subscription_url_mapping(
-                    output_file=output_file,
-                    marzneshin_subscription_path=marzneshin_path,
-                    pasarguard_subscription_path=pasarguard_path
+                    output_file=MIGRATION_CONFIG.url_mapping_output_file,
+                    marzneshin_subscription_path=MIGRATION_CONFIG.marzneshin_subscription_path,
+                    pasarguard_subscription_path=MIGRATION_CONFIG.pasarguard_subscription_path
                 )
                 logger.info("✓ Subscription URL mapping generated successfully")
             except Exception as e:
@@ -143,8 +182,8 @@ class MigrationOrchestrator:
                 logger.warning("Continuing despite URL mapping generation failure...")
             
             # Step 13: Print summary
-            self.statistics['end_time'] = time.time()
-            self.statistics['duration'] = self.statistics['end_time'] - self.statistics['start_time']
+            self.statistics.end_time = time.time()
+            self.statistics.duration = self.statistics.end_time - self.statistics.start_time
             self._print_summary()
             
             logger.info("\n✓ Migration completed successfully!")
@@ -165,11 +204,15 @@ class MigrationOrchestrator:
         self.extractor = MarzneshinExtractor(MARZNESHIN_CONFIG)
         self.extractor.connect()
         
-        # Get all table data
-        self.source_data = self.extractor.extract_all_tables()
+        # Get all table data; usage tables are streamed later, during migration
+        tables = self.extractor.discover_tables()
+        self.streamed_tables = [table for table in tables if table in USAGE_TABLES]
+        self.source_data = self.extractor.extract_all_tables(
+            [table for table in tables if table not in USAGE_TABLES]
+        )
         
         # Special extraction for admin_usage_logs (doesn't exist in Marzneshin, computed from node_user_usages)
-        if 'admin_usage_logs' not in EXCLUDE_TABLES:
+        if 'admin_usage_logs' not in MIGRATION_CONFIG.exclude_tables:
             logger.info("Extracting admin_usage_logs from node_user_usages...")
             admin_usage_logs = self.extractor.extract_admin_usage_logs()
             self.source_data['admin_usage_logs'] = admin_usage_logs
@@ -179,13 +222,39 @@ class MigrationOrchestrator:
         logger.info(f"Extracted data from {len(self.source_data)} tables")
         for table, count in sorted(stats.items()):
             logger.info(f"  {table}: {count} rows")
+        for table in self.streamed_tables:
+            logger.info(f"  {table}: streamed during migration")
+    
+    def _resolve_table_order(self):
+        """Derive the table migration order and levels from the target foreign key graph."""
+        try:
+            dependencies = get_table_dependencies(
+                self.loader.conn,
+                TABLE_ORDER,
+                TABLE_DEPENDENCY_HINTS,
+                keys=self.loader.get_keys()
+            )
+        except Exception as e:
+            logger.warning(f"Could not derive table order from foreign keys, using default order: {e}")
+            self.table_order = list(TABLE_ORDER)
+            self.table_levels = [[table] for table in TABLE_ORDER]
+            return
+        
+        self.table_order = sort_table_dependencies(TABLE_ORDER, dependencies)
+        self.table_levels = group_tables_by_level(self.table_order, dependencies)
+        
+        if self.table_order != TABLE_ORDER:
+            logger.info(f"Table order derived from foreign keys: {', '.join(self.table_order)}")
+        for idx, level in enumerate(self.table_levels, 1):
+            logger.debug(f"  Level {idx}: {', '.join(level)}")
     
     def _clear_target_data(self):
         """Clear all target tables."""
         # Get tables that exist in target
+        exclude_tables = MIGRATION_CONFIG.exclude_tables
         existing_tables = [
-            table for table in TABLE_ORDER
-            if self.loader.table_exists(table) and table not in EXCLUDE_TABLES
+            table for table in self.table_order
+            if table not in exclude_tables and self.loader.table_exists(table)
         ]
         
         logger.info(f"Clearing {len(existing_tables)} tables...")
@@ -193,175 +262,327 @@ class MigrationOrchestrator:
         logger.info("✓ All tables cleared")
     
     def _migrate_tables(self, target_schema: Dict[str, Dict[str, Any]]):
-        """Migrate all tables in correct order."""
-        for table in TABLE_ORDER:
-            if table in EXCLUDE_TABLES:
-                logger.info(f"[SKIP] {table} (excluded)")
-                continue
-            
-            # Get target table name
-            target_table = get_target_table(table)
-            
-            # Check if target table exists
-            if not self.loader.table_exists(target_table):
-                logger.warning(f"[SKIP] {target_table} (table not found in target)")
-                continue
-            
-            # Get source data - check both the table name and any mapped source names
-            source_rows = self.source_data.get(table, [])
-            if not source_rows:
-                # Try mapped table name
-                if table != target_table:
-                    source_rows = self.source_data.get(target_table, [])
-                
-                # Special case: core_configs comes from inbounds
-                if not source_rows and target_table == "core_configs":
-                    source_rows = self.source_data.get("inbounds", [])
-                    table = "inbounds"  # Use inbounds for conversion
-                
-                # Special case: groups comes from services
-                if not source_rows and target_table == "groups":
-                    source_rows = self.source_data.get("services", [])
-                    table = "services"  # Update table name for proper conversion
-                
-                # Special case: users_groups_association comes from users_services
-                if not source_rows and target_table == "users_groups_association":
-                    source_rows = self.source_data.get("users_services", [])
-                    table = "users_services"
-                
-                # Special case: inbounds_groups_association comes from inbounds_services
-                if not source_rows and target_table == "inbounds_groups_association":
-                    source_rows = self.source_data.get("inbounds_services", [])
-                    table = "inbounds_services"
-                
-                # Special case: admin_usage_logs is computed from node_user_usages (already extracted)
-                if not source_rows and target_table == "admin_usage_logs":
-                    source_rows = self.source_data.get("admin_usage_logs", [])
-                    table = "admin_usage_logs"
-                
-                if not source_rows:
-                    logger.info(f"[SKIP] {table} -> {target_table} (no source data)")
-                    continue
-            
-            # Migrate this table
+        """
+        Migrate all tables in dependency order.
+        
+        Tables on the same dependency level do not reference each other and are
+        migrated concurrently by MIGRATION_CONFIG.parallel_workers threads, each
+        with its own source and target connection. A level only starts once the
+        previous one has finished.
+        """
+        # No more workers (and connections) than the widest level can use
+        workers = min(
+            max(1, MIGRATION_CONFIG.parallel_workers),
+            max((len(level) for level in self.table_levels), default=1)
+        )
+        if workers == 1:
+            for table in self.table_order:
+                self._migrate_table_by_name(table, target_schema)
+            return
+        
+        logger.info(f"Migrating {len(self.table_levels)} dependency levels with up to {workers} workers")
+        try:
+            with ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix='migrate',
+                initializer=self._init_worker,
+                # Read once here; workers share them instead of each querying INFORMATION_SCHEMA
+                initargs=(self.loader.get_schema(), self.loader.get_keys())
+            ) as executor:
+                for level in self.table_levels:
+                    futures = [
+                        executor.submit(self._migrate_table_by_name, table, target_schema)
+                        for table in level
+                    ]
+                    for future in futures:
+                        future.result()
+        finally:
+            # Target connections go back to the loader's pool for the later fixup steps
+            for loader in self._worker_loaders:
+                self.loader.release(loader)
+            self._worker_loaders.clear()
+            for extractor in self._worker_extractors:
+                extractor.disconnect()
+            self._worker_extractors.clear()
+            # End any snapshot the main connection holds so later steps see the workers' rows
+            self.loader.conn.commit()
+    
+    def _init_worker(
+        self,
+        target_schema: Dict[str, Dict[str, TargetColumn]],
+        target_keys: Dict[str, Dict[str, Any]]
+    ):
+        """
+        Set up the source and target connections of a worker thread.
+        
+        Runs once per thread as the executor initializer, so every worker reuses
+        its connections for all of the tables it migrates. The target connection
+        is checked out of the main loader's pool and stays open after the
+        workers finish, for add_all_missing_columns to reuse.
+        
+        Args:
+            target_schema: The main loader's cached schema, shared with the worker's loader
+            target_keys: The main loader's cached keys, shared likewise
+        """
+        loader = self.loader.acquire()
+        loader.share_schema(target_schema, target_keys)
+        extractor = MarzneshinExtractor(MARZNESHIN_CONFIG)
+        extractor.connect()
+        
+        self._worker_state.loader = loader
+        self._worker_state.extractor = extractor
+        with self._lock:
+            self._worker_loaders.append(loader)
+            self._worker_extractors.append(extractor)
+    
+    def _get_loader(self) -> PasarguardLoader:
+        """Return the target loader for the current thread."""
+        return getattr(self._worker_state, 'loader', self.loader)
+    
+    def _get_extractor(self) -> MarzneshinExtractor:
+        """Return the source extractor for the current thread."""
+        return getattr(self._worker_state, 'extractor', self.extractor)
+    
+    def _migrate_table_by_name(self, table: str, target_schema: Dict[str, Dict[str, Any]]):
+        """Resolve the source rows for a table in the migration order and migrate it."""
+        if table in MIGRATION_CONFIG.exclude_tables:
+            logger.info(f"[SKIP] {table} (excluded)")
+            return
+        
+        # Get target table name
+        target_table = get_target_table(table)
+        
+        # Check if target table exists (Step 4 already read every target table)
+        if target_table not in target_schema:
+            logger.warning(f"[SKIP] {target_table} (table not found in target)")
+            return
+        
+        # Large usage tables are streamed from the source in primary key chunks;
+        # the next chunk is fetched in the background while the current one is loaded
+        if table in self.streamed_tables:
             self._migrate_table(
                 table,
                 target_table,
-                source_rows,
+                prefetch(self._get_extractor().iter_table_keyset(table, pk=get_table_spec(table).pk or 'id')),
                 target_schema.get(target_table, {})
             )
+            return
+        
+        # Get source data - check both the table name and any mapped source names
+        source_rows = self.source_data.get(table, [])
+        if not source_rows:
+            # Try mapped table name
+            if table != target_table:
+                source_rows = self.source_data.get(target_table, [])
+            
+            # Tables built from a differently named source table (e.g. groups from services)
+            fallback = SOURCE_FALLBACKS.get(target_table)
+            if not source_rows and fallback:
+                source_rows = self.source_data.get(fallback, [])
+                table = fallback  # Convert under the source table's name
+            
+            if not source_rows:
+                logger.info(f"[SKIP] {table} -> {target_table} (no source data)")
+                return
+        
+        # Migrate this table in bulk_size passes; core_configs deduplicates
+        # inbound tags across all rows and is converted in one pass
+        bulk_size = 0 if target_table == "core_configs" else MIGRATION_CONFIG.bulk_size
+        self._migrate_table(
+            table,
+            target_table,
+            chunked(source_rows, bulk_size),
+            target_schema.get(target_table, {}),
+            row_count=len(source_rows)
+        )
+        
+        # Nothing reads these rows again; drop them so peak memory holds the
+        # remaining tables only, not everything extracted in Step 1
+        if table not in LOOKUP_SOURCE_TABLES:
+            self.source_data.pop(table, None)
     
     def _migrate_table(
         self,
         source_table: str,
         target_table: str,
-        source_rows: List[Dict[str, Any]],
-        target_columns: Dict[str, Any]
+        source_batches: Iterable[List[Dict[str, Any]]],
+        target_columns: Dict[str, Any],
+        row_count: Optional[int] = None
     ):
-        """Migrate a single table."""
-        logger.info(f"\n[MIGRATE] {source_table} -> {target_table} ({len(source_rows)} rows)")
+        """Migrate a single table from an iterable of source row batches."""
+        if row_count is not None:
+            logger.info(f"\n[MIGRATE] {source_table} -> {target_table} ({row_count} rows)")
+        else:
+            logger.info(f"\n[MIGRATE] {source_table} -> {target_table} (streaming)")
         
         table_start = time.time()
+        source_total = 0
+        success_total = 0
+        failed_total = 0
+        
+        # Use INSERT IGNORE for tables that might have duplicates
+        ignore_duplicates = get_table_spec(target_table).ignore_duplicates
+        
+        loader = self._get_loader()
+        
+        # Large tables are loaded without their non-unique indexes, rebuilt once at the end
+        deferred_indexes: List[str] = []
+        
+        # Batches are validated and converted in a background thread while the
+        # previous batch is being loaded
+        prepared_batches = None
         
         try:
-            # Step 1: Validate foreign keys
-            logger.info("  Validating foreign keys...")
-            validated_rows = self.validator.validate_foreign_keys(target_table, source_rows)
-            if len(validated_rows) < len(source_rows):
-                logger.info(f"  Filtered {len(source_rows) - len(validated_rows)} rows with invalid foreign keys")
+            if MIGRATION_CONFIG.defer_indexes and (
+                row_count is None or row_count >= MIGRATION_CONFIG.defer_indexes_min_rows
+            ):
+                deferred_indexes = loader.drop_secondary_indexes(target_table)
             
-            # Step 2: Convert data
-            logger.info("  Converting data...")
-            converted_rows = self.converter.convert_table(
-                source_table,
-                validated_rows,
-                target_columns,
-                self.source_data,
-                target_table
+            prepared_batches = prefetch(
+                self._prepare_batches(source_table, target_table, source_batches, target_columns),
+                maxsize=1
             )
+            for source_count, final_rows in prepared_batches:
+                source_total += source_count
+                
+                # Step 4: Load into target
+                logger.info(f"  Loading {len(final_rows)} rows...")
+                success, failed = loader.load_table(
+                    target_table,
+                    final_rows,
+                    ignore_duplicates=ignore_duplicates
+                )
+                success_total += success
+                failed_total += failed
+                
+                logger.info(f"  ✓ Loaded {success}/{len(final_rows)} rows")
+                if failed > 0:
+                    logger.warning(f"  ✗ Failed to load {failed} rows")
             
-            # Step 3: Validate required fields
-            logger.info("  Validating required fields...")
-            final_rows = self.validator.validate_required_fields(
-                target_table,
-                converted_rows,
-                target_columns
-            )
-            
-            # Step 4: Load into target
-            logger.info(f"  Loading {len(final_rows)} rows...")
-            
-            # Use INSERT IGNORE for tables that might have duplicates
-            ignore_duplicates = target_table in [
-                'inbounds',  # Can have duplicates if migration is re-run
-                'node_usages', 'node_user_usages',
-                'admin_usage_logs', 'user_usage_logs', 'node_stats'
-            ]
-            
-            success, failed = self.loader.load_table(
-                target_table,
-                final_rows,
-                ignore_duplicates=ignore_duplicates
-            )
+            if deferred_indexes:
+                loader.restore_secondary_indexes(target_table, deferred_indexes)
+                deferred_indexes = []
             
             # Update validator with actual IDs from database for tables that use INSERT IGNORE
             # This ensures foreign key validation uses actual database IDs, not just source data
             if ignore_duplicates and target_table == "inbounds":
                 logger.info("  Updating validator with actual inbound IDs from database...")
-                self.validator.update_inbound_ids_from_database(self.loader.conn)
+                with self._convert_lock:
+                    self.validator.update_inbound_ids_from_database(loader.conn)
             
             # Update admin IDs after admins are loaded so users can reference them
             if target_table == "admins":
                 logger.info("  Updating validator with actual admin IDs from database...")
-                self.validator.update_admin_ids_from_database(self.loader.conn)
+                with self._convert_lock:
+                    self.validator.update_admin_ids_from_database(loader.conn)
             
             # Update statistics
-            self.statistics['tables_migrated'] += 1
-            self.statistics['total_rows_migrated'] += success
-            self.statistics['total_rows_failed'] += failed
-            self.statistics['table_stats'][target_table] = {
-                'source_rows': len(source_rows),
-                'migrated': success,
-                'failed': failed,
-                'duration': time.time() - table_start
-            }
-            
-            logger.info(f"  ✓ Loaded {success}/{len(final_rows)} rows")
-            if failed > 0:
-                logger.warning(f"  ✗ Failed to load {failed} rows")
+            with self._lock:
+                self.statistics.tables_migrated += 1
+                self.statistics.total_rows_migrated += success_total
+                self.statistics.total_rows_failed += failed_total
+                self.statistics.table_stats[target_table] = TableStats(
+                    source_rows=source_total,
+                    migrated=success_total,
+                    failed=failed_total,
+                    duration=time.time() - table_start
+                )
         
         except Exception as e:
             logger.error(f"  ✗ Failed to migrate {target_table}: {e}")
-            self.statistics['table_stats'][target_table] = {
-                'source_rows': len(source_rows),
-                'error': str(e)
-            }
+            with self._lock:
+                self.statistics.table_stats[target_table] = TableStats(
+                    source_rows=source_total,
+                    error=str(e)
+                )
+        
+        finally:
+            # Stop the conversion thread before closing the stream it reads from
+            if prepared_batches is not None:
+                prepared_batches.close()
+            # Release a partially consumed stream so the source connection is usable again
+            close = getattr(source_batches, 'close', None)
+            if close:
+                close()
+            # Put back indexes dropped for a load that failed part way
+            if deferred_indexes:
+                try:
+                    loader.restore_secondary_indexes(target_table, deferred_indexes)
+                except Exception as e:
+                    logger.error(f"  ✗ Failed to rebuild indexes on {target_table}: {e}")
+    
+    def _prepare_batches(
+        self,
+        source_table: str,
+        target_table: str,
+        source_batches: Iterable[List[Dict[str, Any]]],
+        target_columns: Dict[str, Any]
+    ) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """
+        Validate and convert source row batches for loading.
+        
+        Args:
+            source_table: Source table name
+            target_table: Target table name
+            source_batches: Iterable of source row batches
+            target_columns: Target table column information
+            
+        Yields:
+            Tuples of (source row count, rows to load)
+        """
+        for source_rows in source_batches:
+            with self._convert_lock:
+                # Step 1: Validate foreign keys
+                logger.info("  Validating foreign keys...")
+                validated_rows = self.validator.validate_foreign_keys(target_table, source_rows)
+                if len(validated_rows) < len(source_rows):
+                    logger.info(f"  Filtered {len(source_rows) - len(validated_rows)} rows with invalid foreign keys")
+                
+                # Step 2: Convert data
+                logger.info("  Converting data...")
+                converted_rows = self.converter.convert_table(
+                    source_table,
+                    validated_rows,
+                    target_columns,
+                    self.source_data,
+                    target_table
+                )
+                
+                # Step 3: Validate required fields
+                logger.info("  Validating required fields...")
+                final_rows = self.validator.validate_required_fields(
+                    target_table,
+                    converted_rows,
+                    target_columns
+                )
+                
+            yield len(source_rows), final_rows
     
     def _print_summary(self):
         """Print migration summary."""
-        duration_str = format_duration(self.statistics['duration'])
+        duration_str = format_duration(self.statistics.duration)
         
         summary = {
             'Duration': duration_str,
-            'Tables Migrated': self.statistics['tables_migrated'],
-            'Total Rows Migrated': self.statistics['total_rows_migrated'],
-            'Total Rows Failed': self.statistics['total_rows_failed'],
+            'Tables Migrated': self.statistics.tables_migrated,
+            'Total Rows Migrated': self.statistics.total_rows_migrated,
+            'Total Rows Failed': self.statistics.total_rows_failed,
         }
         
         print_statistics(summary, "MIGRATION SUMMARY")
         
         # Print per-table statistics
-        if self.statistics['table_stats']:
+        if self.statistics.table_stats:
             print("\nPer-Table Statistics:")
             print("-" * 70)
-            for table, stats in self.statistics['table_stats'].items():
-                if 'error' in stats:
-                    print(f"  {table}: ERROR - {stats['error']}")
+            for table, stats in self.statistics.table_stats.items():
+                if stats.error is not None:
+                    print(f"  {table}: ERROR - {stats.error}")
                 else:
                     print(
-                        f"  {table}: {stats['source_rows']} -> "
-                        f"{stats['migrated']} migrated, {stats['failed']} failed "
-                        f"({format_duration(stats['duration'])})"
+                        f"  {table}: {stats.source_rows} -> "
+                        f"{stats.migrated} migrated, {stats.failed} failed "
+                        f"({format_duration(stats.duration)})"
                     )
             print("-" * 70)
     
@@ -394,6 +615,17 @@ def main():
         type=int,
         help='Maximum rows to extract from usage tables (default: 100000, 0 = no limit)'
     )
+    parser.add_argument(
+        '--parallel-workers',
+        type=int,
+        help='Threads migrating independent tables concurrently (default: 4, 1 = serial)'
+    )
+    parser.add_argument(
+        '--driver',
+        type=str,
+        choices=db.DRIVERS,
+        help='MySQL driver (default: auto = mysqlclient if installed, else pymysql)'
+    )
     parser.add_argument(
         '--url-mapping-output',
         type=str,
@@ -422,6 +654,10 @@ def main():
         MIGRATION_CONFIG.log_file = args.log_file
     if args.max_usage_rows is not None:
         MIGRATION_CONFIG.max_usage_table_rows = args.max_usage_rows
+    if args.parallel_workers is not None:
+        MIGRATION_CONFIG.parallel_workers = args.parallel_workers
+    if args.driver:
+        MIGRATION_CONFIG.driver = args.driver
     # Always set URL mapping config (generation is now automatic)
     MIGRATION_CONFIG.url_mapping_output_file = args.url_mapping_output
     MIGRATION_CONFIG.marzneshin_subscription_path = args.marzneshin_subscription_path
@@ -430,7 +666,7 @@ def main():
     # Add excluded tables from command line
     if args.exclude_tables:
         excluded = [t.strip() for t in args.exclude_tables.split(',') if t.strip()]
-        EXCLUDE_TABLES.update(excluded)
+        MIGRATION_CONFIG.exclude_tables = MIGRATION_CONFIG.exclude_tables | frozenset(excluded)
         # Initialize logging early to show excluded tables
         setup_logging(
             level=MIGRATION_CONFIG.log_level,
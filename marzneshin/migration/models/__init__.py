@@ -7,12 +7,19 @@ from migration.models.mappings import (
     get_target_table,
     COLUMN_MAPPINGS,
     TABLE_MAPPINGS,
+    SOURCE_FALLBACKS,
+    LOW_CARDINALITY_COLUMNS,
     MappingType
 )
 from migration.models.schemas import (
     get_pasarguard_schema,
     get_column_info,
-    table_exists
+    build_column_info,
+    ColumnInfo,
+    load_all_keys,
+    table_exists,
+    ColumnSpec,
+    MISSING_COLUMNS
 )
 
 __all__ = [
@@ -20,10 +27,17 @@ __all__ = [
     'get_target_table',
     'COLUMN_MAPPINGS',
     'TABLE_MAPPINGS',
+    'SOURCE_FALLBACKS',
+    'LOW_CARDINALITY_COLUMNS',
     'MappingType',
     'get_pasarguard_schema',
     'get_column_info',
-    'table_exists'
+    'build_column_info',
+    'ColumnInfo',
+    'load_all_keys',
+    'table_exists',
+    'ColumnSpec',
+    'MISSING_COLUMNS'
 ]
 
 
@@ -3,7 +3,8 @@ Column and table mappings between Marzneshin and Pasarguard schemas.
 """
 
 from enum import Enum
-from typing import Dict, Optional, Any, Callable
+from functools import lru_cache
+from typing import Dict, FrozenSet, Optional, Any, Callable, Tuple
 
 
 class MappingType(Enum):
@@ -189,6 +190,40 @@ TABLE_MAPPINGS = {
 }
 
 
+# Source table read for a target table when no source table shares its name: {pasarguard_table: marzneshin_table}
+SOURCE_FALLBACKS = {
+    "core_configs": "inbounds",
+    "groups": "services",
+    "users_groups_association": "users_services",
+    "inbounds_groups_association": "inbounds_services",
+    "admin_usage_logs": "admin_usage_logs",  # Computed from node_user_usages during extraction
+}
+
+
+# Source columns holding a handful of distinct strings: {marzneshin_table: columns}.
+# The extractor keeps one string object per distinct value instead of one per row.
+LOW_CARDINALITY_COLUMNS: Dict[str, FrozenSet[str]] = {
+    "users": frozenset({"data_limit_reset_strategy", "expire_strategy", "sub_last_user_agent"}),
+    "hosts": frozenset({"security", "alpn", "fingerprint"}),
+    "nodes": frozenset({"status", "connection_backend", "xray_version"}),
+}
+
+
+# COLUMN_MAPPINGS flattened to {(table, source_column): ...} so each lookup is a single dict.get.
+# The lookup functions below are also memoized (bounded by the number of distinct columns),
+# which spares get_mapping_info building a new tuple for every unmapped column.
+_MAPPING_INFO: Dict[Tuple[str, str], tuple] = {
+    (table, source_column): mapping
+    for table, columns in COLUMN_MAPPINGS.items()
+    for source_column, mapping in columns.items()
+}
+_TARGET_COLUMNS: Dict[Tuple[str, str], Optional[str]] = {
+    key: None if mapping_type == MappingType.SKIP else (target_col or key[1])
+    for key, (target_col, mapping_type, _) in _MAPPING_INFO.items()
+}
+
+
+@lru_cache(maxsize=None)
 def get_target_column(table: str, source_column: str) -> Optional[str]:
     """
     Get the target column name for a source column.
@@ -200,22 +235,11 @@ def get_target_column(table: str, source_column: str) -> Optional[str]:
     Returns:
         Target column name or None if should be skipped
     """
-    if table not in COLUMN_MAPPINGS:
-        # If no mapping defined, assume direct mapping
-        return source_column
-    
-    if source_column not in COLUMN_MAPPINGS[table]:
-        # If column not in mapping, assume direct mapping
-        return source_column
-    
-    target_col, mapping_type, _ = COLUMN_MAPPINGS[table][source_column]
-    
-    if mapping_type == MappingType.SKIP:
-        return None
-    
-    return target_col or source_column
+    # If no mapping defined, assume direct mapping
+    return _TARGET_COLUMNS.get((table, source_column), source_column)
 
 
+@lru_cache(maxsize=None)
 def get_mapping_info(table: str, source_column: str) -> tuple:
     """
     Get complete mapping information for a column.
@@ -227,13 +251,10 @@ def get_mapping_info(table: str, source_column: str) -> tuple:
     Returns:
         Tuple of (target_column, mapping_type, transform_function)
     """
-    if table not in COLUMN_MAPPINGS:
-        return (source_column, MappingType.DIRECT, None)
-    
-    if source_column not in COLUMN_MAPPINGS[table]:
+    mapping = _MAPPING_INFO.get((table, source_column))
+    if mapping is None:
         return (source_column, MappingType.DIRECT, None)
-    
-    return COLUMN_MAPPINGS[table][source_column]
+    return mapping
 
 
 def get_target_table(source_table: str) -> str:
@@ -2,45 +2,86 @@
 Pasarguard database schema definitions and helpers.
 """
 
-from typing import Dict, Any, Optional
-import pymysql
+import heapq
+import json
+import logging
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Any, Iterable, List, NamedTuple, Optional, Set, Tuple
 
+from migration.db import dict_cursor
 
-def get_pasarguard_schema(conn) -> Dict[str, Dict[str, Any]]:
+logger = logging.getLogger(__name__)
+
+# enum('a','b') in COLUMN_TYPE, and its quoted values ('' escapes a quote inside a value)
+_ENUM_RE = re.compile(r"enum\((.*)\)")
+_ENUM_VALUE_RE = re.compile(r"'((?:[^']|'')*)'")
+
+
+class ColumnInfo(NamedTuple):
+    """Target column as seen by the converter and validator."""
+    type: str
+    column_type: str = ''
+    nullable: bool = True
+    default: Optional[str] = None
+    max_length: Optional[int] = None
+    is_enum: bool = False
+    enum_values: Optional[Tuple[str, ...]] = None
+    is_auto_increment: bool = False
+
+
+def get_pasarguard_schema(
+    conn,
+    tables: Optional[Iterable[str]] = None
+) -> Dict[str, Dict[str, ColumnInfo]]:
     """
     Get Pasarguard database schema information.
     
+    Reads the columns of every table in one INFORMATION_SCHEMA query rather
+    than one query per table.
+    
     Args:
         conn: Database connection
+        tables: Only read these tables (default: every table)
         
     Returns:
         Dictionary of {table_name: {column_name: column_info}}
     """
-    schema = {}
+    schema: Dict[str, Dict[str, ColumnInfo]] = {}
     
-    with conn.cursor() as cursor:
-        # Get all tables
-        cursor.execute("SHOW TABLES")
-        results = cursor.fetchall()
-        
-        # Handle both dict and tuple results
-        if results:
-            if isinstance(results[0], dict):
-                # DictCursor - get first value from dict
-                tables = [list(row.values())[0] for row in results]
-            else:
-                # Regular cursor - get first element
-                tables = [row[0] for row in results]
-        else:
-            tables = []
+    table_filter = ''
+    params: Tuple[str, ...] = ()
+    if tables is not None:
+        params = tuple(tables)
+        if not params:
+            return schema
+        table_filter = f"AND TABLE_NAME IN ({', '.join(['%s'] * len(params))})"
+    
+    with dict_cursor(conn) as cursor:
+        cursor.execute(f"""
+            SELECT 
+                TABLE_NAME,
+                COLUMN_NAME, 
+                DATA_TYPE, 
+                IS_NULLABLE, 
+                COLUMN_DEFAULT, 
+                CHARACTER_MAXIMUM_LENGTH,
+                COLUMN_TYPE,
+                EXTRA
+            FROM INFORMATION_SCHEMA.COLUMNS 
+            WHERE TABLE_SCHEMA = DATABASE()
+            {table_filter}
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """, params or None)
         
-        for table in tables:
-            schema[table] = get_column_info(conn, table)
+        for row in cursor.fetchall():
+            schema.setdefault(row['TABLE_NAME'], {})[row['COLUMN_NAME']] = _column_info(row)
     
     return schema
 
 
-def get_column_info(conn, table: str) -> Dict[str, Any]:
+def get_column_info(conn, table: str) -> Dict[str, ColumnInfo]:
     """
     Get column information for a table.
     
@@ -51,7 +92,7 @@ def get_column_info(conn, table: str) -> Dict[str, Any]:
     Returns:
         Dictionary of {column_name: column_info}
     """
-    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+    with dict_cursor(conn) as cursor:
         cursor.execute("""
             SELECT 
                 COLUMN_NAME, 
@@ -67,33 +108,66 @@ def get_column_info(conn, table: str) -> Dict[str, Any]:
             ORDER BY ORDINAL_POSITION
         """, (table,))
         
-        result = {}
-        for row in cursor.fetchall():
-            data_type = row['DATA_TYPE'].lower()
-            column_type = row.get('COLUMN_TYPE', '').lower()
-            extra = row.get('EXTRA', '').lower()
-            is_enum = data_type == 'enum' or 'enum' in column_type
-            is_auto_increment = 'auto_increment' in extra
-            
-            # Parse enum values if it's an enum
-            enum_values = None
-            if is_enum and 'enum(' in column_type:
-                # Extract enum values: enum('value1','value2')
-                enum_str = column_type[column_type.find('(') + 1:column_type.rfind(')')]
-                enum_values = [v.strip("'") for v in enum_str.split(',')]
-            
-            result[row['COLUMN_NAME']] = {
-                "type": data_type,
-                "column_type": column_type,
-                "nullable": row['IS_NULLABLE'] == "YES",
-                "default": row['COLUMN_DEFAULT'],
-                "max_length": row['CHARACTER_MAXIMUM_LENGTH'],
-                "is_enum": is_enum,
-                "enum_values": enum_values,
-                "is_auto_increment": is_auto_increment,
-            }
-        
-        return result
+        return {row['COLUMN_NAME']: _column_info(row) for row in cursor.fetchall()}
+
+
+def _column_info(row: Dict[str, Any]) -> ColumnInfo:
+    """Build the ColumnInfo of an INFORMATION_SCHEMA.COLUMNS row."""
+    return build_column_info(
+        data_type=row['DATA_TYPE'],
+        column_type=row.get('COLUMN_TYPE', ''),
+        nullable=row['IS_NULLABLE'] == "YES",
+        default=row['COLUMN_DEFAULT'],
+        max_length=row['CHARACTER_MAXIMUM_LENGTH'],
+        extra=row.get('EXTRA', '')
+    )
+
+
+def build_column_info(
+    data_type: str,
+    column_type: str,
+    nullable: bool,
+    default: Optional[str],
+    max_length: Optional[int],
+    extra: str = ''
+) -> ColumnInfo:
+    """
+    Build the ColumnInfo used by the converter and validator.
+    
+    Args:
+        data_type: DATA_TYPE of the column
+        column_type: COLUMN_TYPE of the column (e.g. "enum('a','b')")
+        nullable: Whether the column accepts NULL
+        default: Column default
+        max_length: CHARACTER_MAXIMUM_LENGTH of the column
+        extra: EXTRA of the column (e.g. "auto_increment")
+        
+    Returns:
+        ColumnInfo of the column
+    """
+    # Interned, so the few distinct type names are shared across every column
+    data_type = sys.intern(data_type.lower())
+    column_type = column_type.lower()
+    is_enum = data_type == 'enum' or 'enum' in column_type
+    is_auto_increment = 'auto_increment' in extra.lower()
+    
+    # Parse enum values if it's an enum: enum('value1','value2')
+    enum_values = None
+    match = _ENUM_RE.search(column_type) if is_enum else None
+    if match:
+        # Match the quoted values rather than splitting on commas, which values may contain
+        enum_values = tuple(value.replace("''", "'") for value in _ENUM_VALUE_RE.findall(match.group(1)))
+    
+    return ColumnInfo(
+        type=data_type,
+        column_type=column_type,
+        nullable=nullable,
+        default=default,
+        max_length=max_length,
+        is_enum=is_enum,
+        enum_values=enum_values,
+        is_auto_increment=is_auto_increment
+    )
 
 
 def table_exists(conn, table: str) -> bool:
@@ -107,15 +181,16 @@ def table_exists(conn, table: str) -> bool:
     Returns:
         True if table exists, False otherwise
     """
-    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+    with dict_cursor(conn) as cursor:
+        # An existence probe; stops at the first match instead of counting
         cursor.execute("""
-            SELECT COUNT(*) as count
+            SELECT 1
             FROM INFORMATION_SCHEMA.TABLES 
             WHERE TABLE_SCHEMA = DATABASE() 
             AND TABLE_NAME = %s
+            LIMIT 1
         """, (table,))
-        result = cursor.fetchone()
-        return result['count'] > 0 if result else False
+        return cursor.fetchone() is not None
 
 
 def get_foreign_keys(conn, table: str) -> Dict[str, str]:
@@ -129,7 +204,7 @@ def get_foreign_keys(conn, table: str) -> Dict[str, str]:
     Returns:
         Dictionary of {column_name: referenced_table}
     """
-    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+    with dict_cursor(conn) as cursor:
         cursor.execute("""
             SELECT 
                 COLUMN_NAME,
@@ -144,6 +219,207 @@ def get_foreign_keys(conn, table: str) -> Dict[str, str]:
                 for row in cursor.fetchall()}
 
 
+def load_all_keys(conn) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the primary key, foreign keys and unique key columns of every table.
+    
+    Reads INFORMATION_SCHEMA.KEY_COLUMN_USAGE once for the whole database,
+    instead of get_primary_key, get_foreign_keys and get_unique_constraints
+    querying it per table.
+    
+    Args:
+        conn: Database connection
+        
+    Returns:
+        Dictionary of {table: {'pk': first primary key column or None,
+        'fks': {column: referenced_table}, 'unique': [unique key columns]}}
+    """
+    keys: Dict[str, Dict[str, Any]] = {}
+    
+    with dict_cursor(conn) as cursor:
+        cursor.execute("""
+            SELECT TABLE_NAME, COLUMN_NAME, CONSTRAINT_NAME, REFERENCED_TABLE_NAME
+            FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE()
+            ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+        """)
+        
+        for row in cursor.fetchall():
+            table_keys = keys.setdefault(row['TABLE_NAME'], {'pk': None, 'fks': {}, 'unique': []})
+            if row['CONSTRAINT_NAME'] == 'PRIMARY':
+                if table_keys['pk'] is None:
+                    table_keys['pk'] = row['COLUMN_NAME']
+            elif row['REFERENCED_TABLE_NAME'] is not None:
+                table_keys['fks'][row['COLUMN_NAME']] = row['REFERENCED_TABLE_NAME']
+            else:
+                table_keys['unique'].append(row['COLUMN_NAME'])
+    
+    return keys
+
+
+def get_table_dependencies(
+    conn,
+    tables: Iterable[str],
+    extra_dependencies: Optional[Dict[str, Iterable[str]]] = None,
+    keys: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[str, Set[str]]:
+    """
+    Build the table dependency graph from INFORMATION_SCHEMA foreign keys.
+    
+    Self-references and references to tables outside ``tables`` are ignored.
+    
+    Args:
+        conn: Database connection
+        tables: Tables to include in the graph
+        extra_dependencies: Additional {table: dependencies} edges that are not
+            expressed as foreign keys (e.g. converter state shared between tables)
+        keys: Result of load_all_keys(), when already read
+        
+    Returns:
+        Dictionary of {table: set of tables it depends on}
+    """
+    dependencies: Dict[str, Set[str]] = {table: set() for table in tables}
+    
+    if keys is None:
+        keys = load_all_keys(conn)
+    edges = [
+        (table, referenced)
+        for table, table_keys in keys.items()
+        for referenced in table_keys['fks'].values()
+    ]
+    
+    for table, extra in (extra_dependencies or {}).items():
+        edges.extend((table, dependency) for dependency in extra)
+    
+    for table, referenced in edges:
+        if table == referenced or table not in dependencies or referenced not in dependencies:
+            continue
+        dependencies[table].add(referenced)
+    
+    return dependencies
+
+
+def sort_table_dependencies(
+    tables: Iterable[str],
+    dependencies: Dict[str, Set[str]]
+) -> List[str]:
+    """
+    Order tables so that every table comes after the tables it depends on.
+    
+    Uses Kahn's algorithm. Tables that are ready at the same time are emitted
+    in the order they appear in ``tables``, so a hand-written order that is
+    already valid is returned unchanged. Cycles are broken by deferring the
+    remaining edges of the table with the fewest unresolved dependencies
+    (preferring tables others are waiting on).
+    
+    Args:
+        tables: Tables to order, in preferred order
+        dependencies: Dictionary of {table: set of tables it depends on}
+        
+    Returns:
+        List of table names in dependency order
+    """
+    tables = list(dict.fromkeys(tables))
+    rank = {table: idx for idx, table in enumerate(tables)}
+    
+    depends_on: Dict[str, Set[str]] = {table: set() for table in tables}
+    dependents: Dict[str, Set[str]] = {table: set() for table in tables}
+    for table in tables:
+        for referenced in dependencies.get(table, ()):
+            if referenced in rank and referenced != table:
+                depends_on[table].add(referenced)
+                dependents[referenced].add(table)
+    
+    in_degree = {table: len(deps) for table, deps in depends_on.items()}
+    ready = [(rank[table], table) for table, degree in in_degree.items() if degree == 0]
+    heapq.heapify(ready)
+    
+    order = []
+    remaining = set(tables)
+    while remaining:
+        if not ready:
+            # Cycle: defer the remaining edges of the least-blocked table
+            table = min(
+                remaining,
+                key=lambda t: (in_degree[t], -len(dependents[t] & remaining), rank[t])
+            )
+            logger.warning(
+                f"Foreign key cycle detected, deferring dependencies of {table}: "
+                f"{', '.join(sorted(d for d in depends_on[table] if d in remaining))}"
+            )
+            in_degree[table] = 0
+            heapq.heappush(ready, (rank[table], table))
+        
+        _, table = heapq.heappop(ready)
+        if table not in remaining:
+            continue
+        remaining.discard(table)
+        order.append(table)
+        
+        for dependent in dependents[table]:
+            if dependent in remaining and in_degree[dependent] > 0:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    heapq.heappush(ready, (rank[dependent], dependent))
+    
+    return order
+
+
+def get_table_dependency_order(
+    conn,
+    tables: Iterable[str],
+    extra_dependencies: Optional[Dict[str, Iterable[str]]] = None
+) -> List[str]:
+    """
+    Order tables by the target foreign key graph.
+    
+    Args:
+        conn: Database connection
+        tables: Tables to order, in preferred order
+        extra_dependencies: Additional {table: dependencies} edges
+        
+    Returns:
+        List of table names in dependency order
+    """
+    tables = list(dict.fromkeys(tables))
+    return sort_table_dependencies(tables, get_table_dependencies(conn, tables, extra_dependencies))
+
+
+def group_tables_by_level(
+    order: List[str],
+    dependencies: Dict[str, Set[str]]
+) -> List[List[str]]:
+    """
+    Split a dependency-ordered table list into levels of independent tables.
+    
+    A table's level is one more than the highest level among the tables it
+    depends on that come earlier in ``order``; edges deferred to break a cycle
+    point forward and are therefore ignored. Tables within a level keep their
+    relative order and can be migrated concurrently.
+    
+    Args:
+        order: Tables in dependency order (see sort_table_dependencies)
+        dependencies: Dictionary of {table: set of tables it depends on}
+        
+    Returns:
+        List of levels, each a list of table names
+    """
+    level_of: Dict[str, int] = {}
+    levels: List[List[str]] = []
+    
+    for table in order:
+        level = max(
+            (level_of[dep] + 1 for dep in dependencies.get(table, ()) if dep in level_of),
+            default=0
+        )
+        level_of[table] = level
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(table)
+    
+    return levels
+
+
 def get_primary_key(conn, table: str) -> Optional[str]:
     """
     Get primary key column for a table.
@@ -155,7 +431,7 @@ def get_primary_key(conn, table: str) -> Optional[str]:
     Returns:
         Primary key column name or None
     """
-    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+    with dict_cursor(conn) as cursor:
         cursor.execute("""
             SELECT COLUMN_NAME
             FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
@@ -181,7 +457,7 @@ def get_unique_constraints(conn, table: str) -> list:
     Returns:
         List of unique column names
     """
-    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+    with dict_cursor(conn) as cursor:
         cursor.execute("""
             SELECT COLUMN_NAME
             FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
@@ -193,3 +469,111 @@ def get_unique_constraints(conn, table: str) -> list:
         return [row['COLUMN_NAME'] for row in cursor.fetchall()]
 
 
+
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    """Column that the schema fixups add to (or correct on) a Pasarguard table."""
+    name: str
+    definition: str  # Column definition used in ADD/MODIFY/CHANGE COLUMN
+    column_type: str  # COLUMN_TYPE the server reports for the definition (lowercase)
+    nullable: bool = True
+    default: Optional[str] = None
+    rename_from: Optional[str] = None  # Older name renamed with CHANGE COLUMN if present
+    references: Optional[Tuple[str, str]] = None  # (table, column) FK added if that table exists
+    matches: Optional[Callable[[Any], bool]] = None  # Existing column (TargetColumn) is MODIFYed unless this holds
+    backfill: Optional[Tuple[str, str]] = None  # (SET, WHERE) run before MODIFY COLUMN
+    cleanup: Optional[Tuple[str, str]] = None  # (SET, WHERE) run on a pre-existing column
+    # ALTER clauses, built once when MISSING_COLUMNS is defined
+    add_clause: str = field(init=False, repr=False)
+    modify_clause: str = field(init=False, repr=False)
+    rename_clause: Optional[str] = field(init=False, repr=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'add_clause', f"ADD COLUMN `{self.name}` {self.definition}")
+        object.__setattr__(self, 'modify_clause', f"MODIFY COLUMN `{self.name}` {self.definition}")
+        object.__setattr__(self, 'rename_clause', (
+            f"CHANGE COLUMN `{self.rename_from}` `{self.name}` {self.definition}"
+            if self.rename_from else None
+        ))
+
+
+DEFAULT_NOTIFICATION_ENABLE = json.dumps({
+    "create": False,
+    "modify": False,
+    "delete": False,
+    "status_change": False,
+    "reset_data_usage": False,
+    "data_reset_by_next": False,
+    "subscription_revoked": False
+}, sort_keys=True)
+# Escape the JSON string for use in SQL (escape single quotes by doubling them for MySQL)
+_NOTIFICATION_ENABLE_LITERAL = "'" + DEFAULT_NOTIFICATION_ENABLE.replace("'", "''") + "'"
+# Then wrap in CAST(... AS JSON) for proper JSON default value
+_NOTIFICATION_ENABLE_DEFAULT = f"CAST({_NOTIFICATION_ENABLE_LITERAL} AS JSON)"
+
+# Columns expected by the latest PasarGuard version that older schemas may lack.
+# Needed because the Alembic version is set without running all migrations.
+MISSING_COLUMNS: Dict[str, Tuple[ColumnSpec, ...]] = {
+    'admins': (
+        ColumnSpec('discord_id', "BIGINT DEFAULT NULL", 'bigint'),
+        ColumnSpec('discord_webhook', "VARCHAR(1024) DEFAULT NULL", 'varchar(1024)'),
+        ColumnSpec('sub_template', "VARCHAR(1024) DEFAULT NULL", 'varchar(1024)'),
+        ColumnSpec('sub_domain', "VARCHAR(256) DEFAULT NULL", 'varchar(256)'),
+        ColumnSpec('profile_title', "VARCHAR(512) DEFAULT NULL", 'varchar(512)'),
+        ColumnSpec('support_url', "VARCHAR(1024) DEFAULT NULL", 'varchar(1024)'),
+        # Named users_usage in older versions
+        ColumnSpec(
+            'used_traffic', "BIGINT NOT NULL DEFAULT 0", 'bigint',
+            nullable=False, default='0', rename_from='users_usage'
+        ),
+        ColumnSpec('is_disabled', "TINYINT(1) NOT NULL DEFAULT 0", 'tinyint(1)', nullable=False, default='0'),
+        # Must be NOT NULL with a default; NULL values are replaced before the column is fixed
+        ColumnSpec(
+            'notification_enable', f"JSON NOT NULL DEFAULT {_NOTIFICATION_ENABLE_DEFAULT}", 'json',
+            nullable=False, default=_NOTIFICATION_ENABLE_DEFAULT,
+            matches=lambda column: not column.is_nullable and column.column_default is not None,
+            backfill=(f"notification_enable = {_NOTIFICATION_ENABLE_LITERAL}", "notification_enable IS NULL")
+        ),
+    ),
+    'users': (
+        ColumnSpec('proxy_settings', "JSON NOT NULL DEFAULT ('{}')", 'json', nullable=False, default="'{}'"),
+    ),
+    'user_templates': (
+        ColumnSpec('extra_settings', "JSON DEFAULT NULL", 'json'),
+        ColumnSpec('on_hold_timeout', "INT DEFAULT NULL", 'int'),
+        ColumnSpec(
+            'status', "ENUM('active', 'on_hold') NOT NULL DEFAULT 'active'", "enum('active','on_hold')",
+            nullable=False, default='active'
+        ),
+        ColumnSpec('reset_usages', "TINYINT(1) NOT NULL DEFAULT 0", 'tinyint(1)', nullable=False, default='0'),
+        ColumnSpec(
+            'data_limit_reset_strategy',
+            "ENUM('no_reset', 'day', 'week', 'month', 'year') NOT NULL DEFAULT 'no_reset'",
+            "enum('no_reset','day','week','month','year')",
+            nullable=False, default='no_reset'
+        ),
+        ColumnSpec('is_disabled', "TINYINT(1) NOT NULL DEFAULT 0", 'tinyint(1)', nullable=False, default='0'),
+    ),
+    'nodes': (
+        ColumnSpec('api_key', "VARCHAR(36) NULL", 'varchar(36)'),
+        ColumnSpec('core_config_id', "INT NULL", 'int', references=('core_configs', 'id')),
+        ColumnSpec('max_logs', "BIGINT NOT NULL DEFAULT 1000", 'bigint', nullable=False, default='1000'),
+        ColumnSpec('gather_logs', "TINYINT(1) NOT NULL DEFAULT 1", 'tinyint(1)', nullable=False, default='1'),
+    ),
+    'hosts': (
+        # Existing rows take the '' default when the column is added
+        ColumnSpec(
+            'status', "VARCHAR(60) NULL DEFAULT ''", 'varchar(60)', default='',
+            matches=lambda column: column.matches('varchar', 60, defaults=('', None)),
+            # Clean up legacy empty array values
+            cleanup=("status = ''", "status IS NULL OR status IN ('[]', '{}')")
+        ),
+        ColumnSpec('ech_config_list', "VARCHAR(512) DEFAULT NULL", 'varchar(512)'),
+        ColumnSpec(
+            'alpn', "VARCHAR(14) NULL DEFAULT NULL", 'varchar(14)',
+            matches=lambda column: column.matches('varchar', 14),
+            cleanup=("alpn = NULL", "alpn IN ('none', '', '[]')")
+        ),
+    ),
+}
@@ -7,13 +7,19 @@ import logging
 import uuid
 import secrets
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Tuple
 import xxhash
 
+from migration.config import MIGRATION_CONFIG
 from migration.models.mappings import get_mapping_info, get_target_table, MappingType
+from migration.models.schemas import ColumnInfo
+from migration.utils.helpers import json_dumps, json_loads
 
 logger = logging.getLogger(__name__)
 
+# Value written to NOT NULL / malformed JSON columns
+EMPTY_JSON_OBJECT = '{}'
+
 
 class DataConverter:
     """Convert Marzneshin data to Pasarguard format."""
@@ -25,6 +31,11 @@ class DataConverter:
         self.used_usernames = set()
         self.used_config_names = set()  # Track used core_config names
         self.inbound_id_to_final_tag_map = {}  # Map inbound_id to final unique tag
+        self.string_widths: Dict[str, Dict[str, int]] = {}  # {table: {column: max length}}
+        self.column_kinds: Dict[str, Dict[str, str]] = {}  # {table: {column: conversion kind}}
+        # {table: {source column: (target column, transform name, transform method)}},
+        # resolved once per column
+        self.column_plans: Dict[str, Dict[str, Tuple[Optional[str], Optional[str], Optional[Callable]]]] = {}
     
     def convert_table(
         self,
@@ -68,9 +79,11 @@ class DataConverter:
                     converted_rows.append(converted_row)
             except Exception as e:
                 logger.error(f"Error converting row {idx} in {table}: {e}")
-                import traceback
-                logger.debug(f"Traceback: {traceback.format_exc()}")
-                logger.debug(f"Failed row: {row}")
+                # Formatting the traceback and row is skipped unless DEBUG is on
+                if logger.isEnabledFor(logging.DEBUG):
+                    import traceback
+                    logger.debug(f"Traceback: {traceback.format_exc()}")
+                    logger.debug(f"Failed row: {row}")
                 continue
         
         logger.info(f"Successfully converted {len(converted_rows)}/{len(rows)} rows")
@@ -218,7 +231,7 @@ class DataConverter:
                 # Create core_config entry
                 core_config = {
                     "name": core_config_name,
-                    "config": json.dumps(xray_config),  # Convert to JSON string
+                    "config": json_dumps(xray_config),  # Convert to JSON string
                     "exclude_inbound_tags": None,  # Will be converted to None for empty sets
                     "fallbacks_inbound_tags": None,  # Will be converted to None for empty sets
                     "created_at": datetime.now(timezone.utc),  # Add required created_at field
@@ -575,20 +588,28 @@ class DataConverter:
         elif table == "inbounds_services":
             table = "inbounds_groups_association"
         
+        plan = self.column_plans.get(table)
+        if plan is None:
+            plan = self.column_plans[table] = {}
+        
         for source_col, value in row.items():
-            target_col, mapping_type, transform_func = get_mapping_info(table, source_col)
+            step = plan.get(source_col)
+            if step is None:
+                step = plan[source_col] = self._plan_column(table, source_col)
+            target_col, transform_name, transform_method = step
             
-            # Skip if mapping says to skip
-            if mapping_type == MappingType.SKIP:
+            # Skipped columns, and columns only read by computed fields
+            if not target_col:
                 continue
             
             # Apply transformation if needed
-            if transform_func:
-                value = self._apply_transform(transform_func, value, row, table, source_col)
+            if transform_method:
+                try:
+                    value = transform_method(value, row, table, source_col)
+                except Exception as e:
+                    logger.warning(f"Transform {transform_name} failed for {table}.{source_col}: {e}")
             
-            # Set the value
-            if target_col:
-                converted[target_col] = value
+            converted[target_col] = value
         
         # Add computed fields
         converted = self._add_computed_fields(table, row, converted, all_data)
@@ -598,26 +619,31 @@ class DataConverter:
         
         return converted
     
-    def _apply_transform(
+    def _plan_column(
         self,
-        transform_name: str,
-        value: Any,
-        row: Dict[str, Any],
         table: str,
-        column: str
-    ) -> Any:
-        """Apply a named transformation."""
-        transform_method = getattr(self, f"_transform_{transform_name}", None)
+        source_col: str
+    ) -> Tuple[Optional[str], Optional[str], Optional[Callable]]:
+        """
+        Resolve how a source column is converted.
         
-        if transform_method:
-            try:
-                return transform_method(value, row, table, column)
-            except Exception as e:
-                logger.warning(f"Transform {transform_name} failed for {table}.{column}: {e}")
-                return value
-        else:
-            logger.warning(f"Unknown transform: {transform_name}")
-            return value
+        The transform named in COLUMN_MAPPINGS is looked up here, once, instead
+        of with getattr on every row.
+        
+        Returns:
+            Tuple of (target_column, transform_name, transform_method); target_column
+            is None when the column is skipped or only feeds a computed field
+        """
+        target_col, mapping_type, transform_name = get_mapping_info(table, source_col)
+        if mapping_type == MappingType.SKIP or not target_col:
+            return (None, None, None)
+        
+        transform_method = None
+        if transform_name:
+            transform_method = getattr(self, f"_transform_{transform_name}", None)
+            if transform_method is None:
+                logger.warning(f"Unknown transform: {transform_name}")
+        return (target_col, transform_name, transform_method)
     
     def _add_computed_fields(
         self,
@@ -714,7 +740,8 @@ class DataConverter:
             inbound_id = source_row.get('inbound_id')
             if inbound_id and inbound_id in self.inbound_id_to_final_tag_map:
                 converted_row['inbound_tag'] = self.inbound_id_to_final_tag_map[inbound_id]
-                logger.debug(f"Host {source_row.get('id')}: Using final tag '{converted_row['inbound_tag']}' for inbound_id {inbound_id}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Host {source_row.get('id')}: Using final tag '{converted_row['inbound_tag']}' for inbound_id {inbound_id}")
         
         elif table == "admin_usage_logs":
             # Ensure used_traffic_at_reset is set (default to 0 since we don't have historical reset data)
@@ -740,6 +767,9 @@ class DataConverter:
         """Validate and convert data types."""
         converted = {}
         
+        string_widths = self._get_string_widths(table, target_columns)
+        column_kinds = self._get_column_kinds(table, target_columns)
+        
         # Special handling: preserve name field for core_configs even if conversion fails
         original_name = None
         if table == "core_configs" and "name" in row:
@@ -757,10 +787,10 @@ class DataConverter:
             col_info = target_columns[col]
             
             try:
-                converted_value = self._convert_type(value, col_info)
+                converted_value = self._convert_type(value, col_info, column_kinds[col])
                 
                 # Handle NOT NULL constraints
-                if converted_value is None and not col_info['nullable']:
+                if converted_value is None and not col_info.nullable:
                     converted_value = self._get_default_value(col_info, table, col)
                 
                 # Special handling for hosts.path field - Pasarguard requires string, not None
@@ -775,12 +805,12 @@ class DataConverter:
                         logger.warning(f"Core config name was None/empty, using original: {converted_value}")
                 
                 # Truncate strings if needed
-                if col_info.get('max_length') and isinstance(converted_value, str):
-                    if len(converted_value) > col_info['max_length']:
-                        logger.warning(
-                            f"Truncating {table}.{col}: {len(converted_value)} -> {col_info['max_length']}"
-                        )
-                        converted_value = converted_value[:col_info['max_length']]
+                max_length = string_widths.get(col)
+                if max_length is not None and isinstance(converted_value, str) and len(converted_value) > max_length:
+                    logger.warning(
+                        f"Truncating {table}.{col}: {len(converted_value)} -> {max_length}"
+                    )
+                    converted_value = converted_value[:max_length]
                 
                 converted[col] = converted_value
                 
@@ -801,15 +831,78 @@ class DataConverter:
         
         return converted
     
-    def _convert_type(self, value: Any, col_info: Dict[str, Any]) -> Any:
-        """Convert value to target type."""
+    def _get_string_widths(self, table: str, target_columns: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Get the maximum length of each length-limited column, computed once per table.
+        
+        Returns an empty mapping when MIGRATION_CONFIG.truncate_strings is disabled.
+        """
+        widths = self.string_widths.get(table)
+        if widths is None:
+            widths = {}
+            if MIGRATION_CONFIG.truncate_strings:
+                widths = {
+                    col: col_info.max_length
+                    for col, col_info in target_columns.items()
+                    if col_info.max_length
+                }
+            self.string_widths[table] = widths
+        return widths
+    
+    def _get_column_kinds(self, table: str, target_columns: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Classify each target column for _convert_type, computed once per table.
+        
+        Returns:
+            Mapping of {column: kind}, kind being one of 'bool', 'bigint', 'int',
+            'float', 'datetime', 'json', 'enum' or 'str'
+        """
+        kinds = self.column_kinds.get(table)
+        if kinds is None:
+            kinds = {
+                col: self._column_kind(col_info)
+                for col, col_info in target_columns.items()
+            }
+            self.column_kinds[table] = kinds
+        return kinds
+    
+    @staticmethod
+    def _column_kind(col_info: ColumnInfo) -> str:
+        """Classify a target column by the conversion its values need."""
+        col_type = col_info.type.lower()
+        if col_type in ('bool', 'boolean', 'tinyint'):
+            return 'bool'
+        if 'bigint' in col_type:
+            return 'bigint'
+        if 'int' in col_type:
+            return 'int'
+        if any(t in col_type for t in ('float', 'double', 'decimal', 'numeric')):
+            return 'float'
+        if any(t in col_type for t in ('datetime', 'timestamp')):
+            return 'datetime'
+        if 'json' in col_type:
+            return 'json'
+        if col_info.is_enum:
+            return 'enum'
+        return 'str'
+    
+    def _convert_type(self, value: Any, col_info: ColumnInfo, kind: Optional[str] = None) -> Any:
+        """
+        Convert value to target type.
+        
+        Args:
+            value: Value to convert
+            col_info: Target column information
+            kind: The column's _column_kind, when already known
+        """
         if value is None:
             return None
         
-        col_type = col_info['type'].lower()
+        if kind is None:
+            kind = self._column_kind(col_info)
         
         # Boolean/TinyInt
-        if col_type in ('bool', 'boolean', 'tinyint'):
+        if kind == 'bool':
             if isinstance(value, bool):
                 return value
             if isinstance(value, int):
@@ -817,28 +910,28 @@ class DataConverter:
             return str(value).lower() in ('true', '1', 't', 'yes')
         
         # BigInteger
-        if 'bigint' in col_type:
+        if kind == 'bigint':
             try:
                 return int(value)
             except (ValueError, TypeError):
                 return 0
         
         # Integer
-        if 'int' in col_type and 'bigint' not in col_type:
+        if kind == 'int':
             try:
                 return int(value)
             except (ValueError, TypeError):
                 return None
         
         # Float/Double
-        if any(t in col_type for t in ('float', 'double', 'decimal', 'numeric')):
+        if kind == 'float':
             try:
                 return float(value)
             except (ValueError, TypeError):
                 return None
         
         # DateTime/Timestamp
-        if any(t in col_type for t in ('datetime', 'timestamp')):
+        if kind == 'datetime':
             if isinstance(value, datetime):
                 return value
             if isinstance(value, str):
@@ -854,22 +947,22 @@ class DataConverter:
                         return None
         
         # JSON
-        if 'json' in col_type:
+        if kind == 'json':
             if isinstance(value, (dict, list)):
-                return json.dumps(value)
+                return json_dumps(value)
             if isinstance(value, str):
                 if value.strip() == "":
-                    return json.dumps({})
+                    return EMPTY_JSON_OBJECT
                 try:
-                    json.loads(value)
+                    json_loads(value)
                     return value
                 except json.JSONDecodeError:
-                    return json.dumps({})
+                    return EMPTY_JSON_OBJECT
         
         # Enum
-        if col_info.get('is_enum'):
+        if kind == 'enum':
             str_value = str(value).strip()
-            enum_values = col_info.get('enum_values', [])
+            enum_values = col_info.enum_values
             if enum_values and str_value not in enum_values:
                 # Return first enum value as default
                 return enum_values[0] if enum_values else None
@@ -878,13 +971,13 @@ class DataConverter:
         # Text/String
         return str(value) if value is not None else None
     
-    def _get_default_value(self, col_info: Dict[str, Any], table: str, column: str) -> Any:
+    def _get_default_value(self, col_info: ColumnInfo, table: str, column: str) -> Any:
         """Get default value for NOT NULL columns."""
         # Use database default if available
-        if col_info.get('default') is not None:
-            return col_info['default']
+        if col_info.default is not None:
+            return col_info.default
         
-        col_type = col_info['type'].lower()
+        col_type = col_info.type.lower()
         
         if col_type in ('bool', 'boolean', 'tinyint'):
             return False
@@ -899,10 +992,10 @@ class DataConverter:
             return datetime.now()
         
         if 'json' in col_type:
-            return json.dumps({})
+            return EMPTY_JSON_OBJECT
         
-        if col_info.get('is_enum'):
-            enum_values = col_info.get('enum_values', [])
+        if col_info.is_enum:
+            enum_values = col_info.enum_values
             return enum_values[0] if enum_values else ""
         
         return ""
@@ -998,8 +1091,9 @@ class DataConverter:
         """Generate proxy settings JSON from user key."""
         if user_key:
             # Use Marzneshin's UUID generation algorithm for consistency
-            user_uuid = str(uuid.UUID(bytes=xxhash.xxh128(user_key.encode()).digest()))
-            user_password = xxhash.xxh128(user_key.encode()).hexdigest()[:22]
+            key_hash = xxhash.xxh128(user_key.encode())
+            user_uuid = str(uuid.UUID(bytes=key_hash.digest()))
+            user_password = key_hash.hexdigest()[:22]
         else:
             # Generate random credentials
             user_uuid = str(uuid.uuid4())
@@ -1017,7 +1111,7 @@ class DataConverter:
             }
         }
         
-        return json.dumps(proxy_settings)
+        return json_dumps(proxy_settings)
     
     def _ensure_unique_username(self, username: str, user_id: Optional[int] = None) -> str:
         """Ensure username is unique."""
@@ -4,7 +4,7 @@ Data validators for migration.
 
 import logging
 from typing import Dict, List, Any, Set
-from pymysql.cursors import DictCursor
+from migration.db import dict_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -63,7 +63,7 @@ class DataValidator:
             conn: Database connection
         """
         try:
-            with conn.cursor(DictCursor) as cursor:
+            with dict_cursor(conn) as cursor:
                 cursor.execute("SELECT id FROM inbounds")
                 results = cursor.fetchall()
                 self.valid_inbound_ids = {row['id'] for row in results}
@@ -80,7 +80,7 @@ class DataValidator:
             conn: Database connection
         """
         try:
-            with conn.cursor(DictCursor) as cursor:
+            with dict_cursor(conn) as cursor:
                 cursor.execute("SELECT id FROM admins")
                 results = cursor.fetchall()
                 self.valid_admin_ids = {row['id'] for row in results}
@@ -269,10 +269,10 @@ class DataValidator:
         required_cols = []
         for col, info in target_columns.items():
             # Skip id columns that are AUTO_INCREMENT (they're auto-generated)
-            if col == 'id' and info.get('is_auto_increment', False):
+            if col == 'id' and info.is_auto_increment:
                 continue
             # Skip columns that are nullable or have defaults
-            if not info['nullable'] and info['default'] is None:
+            if not info.nullable and info.default is None:
                 required_cols.append(col)
         
         if not required_cols:
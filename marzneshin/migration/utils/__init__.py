@@ -9,7 +9,11 @@ from migration.utils.logger import (
 from migration.utils.helpers import (
     confirm_action,
     print_statistics,
-    format_duration
+    format_duration,
+    json_dumps,
+    json_loads,
+    chunked,
+    prefetch
 )
 
 __all__ = [
@@ -17,6 +21,10 @@ __all__ = [
     'ColoredFormatter',
     'confirm_action',
     'print_statistics',
-    'format_duration'
+    'format_duration',
+    'json_dumps',
+    'json_loads',
+    'chunked',
+    'prefetch'
 ]
 
@@ -2,7 +2,16 @@
 Helper utility functions.
 """
 
-from typing import Dict, Any
+import json
+import queue
+import threading
+from itertools import islice
+from typing import Dict, Any, Iterable, Iterator, List
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
 
 
 def confirm_action(prompt: str) -> bool:
@@ -77,4 +86,142 @@ def format_duration(seconds: float) -> str:
     return " ".join(parts) if parts else "0s"
 
 
+def json_dumps(value: Any, sort_keys: bool = False) -> str:
+    """
+    Serialize a value to a JSON string, with orjson when it is installed.
+    
+    Falls back to the standard library for values orjson rejects (e.g. Decimal
+    or integers wider than 64 bits), so both paths accept the same input.
+    
+    Args:
+        value: Value to serialize
+        sort_keys: Whether to sort dictionary keys
+        
+    Returns:
+        JSON string
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(value, option=option).decode()
+        except TypeError:
+            pass
+    return json.dumps(value, sort_keys=sort_keys)
+
+
+def json_loads(value: str) -> Any:
+    """
+    Parse a JSON string, with orjson when it is installed.
+    
+    Falls back to the standard library for documents orjson rejects (e.g. the
+    NaN and Infinity literals), so both paths accept the same input.
+    
+    Args:
+        value: JSON string
+        
+    Returns:
+        Parsed value
+        
+    Raises:
+        json.JSONDecodeError: If the string is not valid JSON
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(value)
+
 
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Split an iterable into consecutive lists of at most ``size`` items.
+    
+    Args:
+        iterable: Items to split
+        size: Maximum items per chunk (0 or less yields everything as one chunk)
+        
+    Returns:
+        Generator yielding the chunks in order
+    """
+    iterator = iter(iterable)
+    if size <= 0:
+        chunk = list(iterator)
+        if chunk:
+            yield chunk
+        return
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _PrefetchError:
+    """Carries an exception raised by the prefetch producer thread."""
+    
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_PREFETCH_END = object()
+
+
+def prefetch(iterable: Iterable[Any], maxsize: int = 4) -> Iterator[Any]:
+    """
+    Iterate over an iterable in a background thread, buffering ahead of the consumer.
+    
+    Used to overlap reading the next batch from the source database with
+    loading the current one into the target. At most ``maxsize`` items are
+    buffered. Exceptions raised by the iterable are re-raised in the consumer.
+    Closing the returned generator stops the producer and closes the iterable
+    from the producer thread.
+    
+    Args:
+        iterable: Items to produce (e.g. a batch generator)
+        maxsize: Maximum number of buffered items
+        
+    Returns:
+        Generator yielding the items of ``iterable`` in order
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    break
+                buffer.put(item)
+        except BaseException as e:
+            buffer.put(_PrefetchError(e))
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close:
+                close()
+            buffer.put(_PREFETCH_END)
+    
+    thread = threading.Thread(
+        target=produce,
+        name=f"{threading.current_thread().name}-prefetch",
+        daemon=True
+    )
+    thread.start()
+    
+    try:
+        while True:
+            item = buffer.get()
+            if item is _PREFETCH_END:
+                return
+            if isinstance(item, _PrefetchError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        # Keep draining so a producer blocked on a full buffer can see the stop flag
+        while thread.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
@@ -2,7 +2,10 @@
 Logging configuration with colorization.
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 import os
 from pathlib import Path
@@ -56,27 +59,33 @@ class ColoredFormatter(logging.Formatter):
         return message
 
 
+# Background listener that writes queued records to the log file
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
 def setup_logging(
     level: str = 'INFO',
-    log_file: Optional[str] = None,
+    log_file: str = "",
     format_string: Optional[str] = None,
     use_colors: bool = True
 ):
     """
     Setup logging configuration.
     
+    The console handler writes synchronously, so log lines stay in order with
+    prompts and summaries printed to stdout. File records are put on a queue
+    and written by a QueueListener thread, so worker threads never wait on
+    file I/O.
+    
     Args:
         level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-        log_file: Optional log file path
+        log_file: Log file path (empty to disable file logging)
         format_string: Optional custom format string (for file logging)
         use_colors: Whether to use colored output for console
     """
     # Convert string level to logging level
     numeric_level = getattr(logging, level.upper(), logging.INFO)
     
-    # Create handlers
-    handlers = []
-    
     # Console handler with colors (no timestamps)
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(numeric_level)
@@ -87,9 +96,9 @@ def setup_logging(
         # Plain formatter without timestamps
         console_formatter = logging.Formatter('%(levelname)s - %(message)s')
     console_handler.setFormatter(console_formatter)
-    handlers.append(console_handler)
     
     # File handler if specified (with timestamps)
+    file_handler = None
     if log_file:
         log_path = Path(log_file)
         log_path.parent.mkdir(parents=True, exist_ok=True)
@@ -100,14 +109,19 @@ def setup_logging(
             format_string = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         file_formatter = logging.Formatter(format_string)
         file_handler.setFormatter(file_formatter)
-        handlers.append(file_handler)
     
-    # Configure root logger
-    logging.basicConfig(
-        level=numeric_level,
-        handlers=handlers,
-        format='%(message)s'  # Default format (will be overridden by handlers)
-    )
+    # Configure root logger (once, like logging.basicConfig)
+    global _listener
+    root_logger = logging.getLogger()
+    root_logger.setLevel(numeric_level)
+    if not root_logger.handlers:
+        root_logger.addHandler(console_handler)
+        if file_handler is not None:
+            log_queue = queue.SimpleQueue()
+            root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+            _listener.start()
+            atexit.register(_listener.stop)
     
     # Set level for migration package
     migration_logger = logging.getLogger('migration')